@@ -1,181 +1,2322 @@
-from flask import Flask, render_template, jsonify, request
+from flask import Flask, Response, g, has_request_context, render_template, jsonify, request
 from flask_cors import CORS
 import psutil
 import platform
 import json
 from datetime import datetime
 import time
-import google.generativeai as genai
 import os
-import shutil
-from pathlib import Path
+import copy
+import hashlib
+import gzip
+import zlib
+import mmap
+import queue
+import stat
+import struct
+import math
+import bisect
+import heapq
+import functools
+import tempfile
+import uuid
+import threading
+import socket
+from array import array
+from collections import OrderedDict, deque, namedtuple
+from contextlib import contextmanager
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError, wait, FIRST_COMPLETED
+
+
+
+class StartupProfile:
+    """Seconds from process start (including any bootloader unpacking) to each startup phase"""
+
+    def __init__(self):
+        try:
+            self.origin = psutil.Process().create_time()
+        except (psutil.Error, OSError):
+            self.origin = time.time()
+        self.phases = []
+
+    def mark(self, phase):
+        self.phases.append((phase, time.time() - self.origin))
+
+    def to_dict(self):
+        return {phase: round(seconds, 3) for phase, seconds in self.phases}
+
+    def report(self):
+        lines = ['Startup profile (seconds since process start):']
+        previous = 0.0
+        for phase, seconds in self.phases:
+            lines.append(f'  {phase:<22} {seconds:8.3f}  (+{seconds - previous:.3f})')
+            previous = seconds
+        return '\n'.join(lines)
+
+
+startup_profile = StartupProfile()
+startup_profile.mark('imports')
 
 app = Flask(__name__)
 CORS(app)
 
-# Configure Gemini API
+# Gemini API (the SDK is imported and configured on first use)
 GEMINI_API_KEY = os.getenv('GEMINI_API_KEY', '')
-genai.configure(api_key=GEMINI_API_KEY)
+GEMINI_MODEL = os.getenv('GEMINI_MODEL', 'gemini-2.5-flash-lite')
+
+# Approximate token budget for the diagnostic data embedded in the AI prompt
+PROMPT_TOKEN_BUDGET = int(os.getenv('PCDOCTOR_PROMPT_TOKEN_BUDGET', '1500'))
+
+# Seconds to wait for the AI model before answering with the local analysis
+LLM_TIMEOUT = float(os.getenv('PCDOCTOR_LLM_TIMEOUT', '20'))
+
+# AI analysis cache (seconds an analysis stays valid, analyses kept)
+ANALYSIS_CACHE_TTL = float(os.getenv('PCDOCTOR_ANALYSIS_CACHE_TTL', '300'))
+ANALYSIS_CACHE_SIZE = int(os.getenv('PCDOCTOR_ANALYSIS_CACHE_SIZE', '32'))
+
+# Background sampler settings (seconds between samples, samples kept)
+SAMPLE_INTERVAL = float(os.getenv('PCDOCTOR_SAMPLE_INTERVAL', '1.0'))
+SAMPLE_HISTORY = int(os.getenv('PCDOCTOR_SAMPLE_HISTORY', '300'))
+
+# Window (seconds) over which disk and network rates are averaged
+RATE_WINDOW = float(os.getenv('PCDOCTOR_RATE_WINDOW', '5'))
+
+# Where PC Doctor keeps its local state (indexes, history)
+DATA_DIR = os.getenv('PCDOCTOR_DATA_DIR', os.path.join(os.path.expanduser('~'), '.pcdoctor'))
+
+# Disk usage index (directories to index, seconds between automatic refreshes)
+DISK_INDEX_ROOTS = [p for p in os.getenv('PCDOCTOR_DISK_INDEX_ROOTS', os.path.expanduser('~')).split(os.pathsep) if p]
+DISK_INDEX_INTERVAL = float(os.getenv('PCDOCTOR_DISK_INDEX_INTERVAL', '600'))
+
+# Metric history (seconds between recorded samples, hours of raw samples kept)
+HISTORY_INTERVAL = float(os.getenv('PCDOCTOR_HISTORY_INTERVAL', '5'))
+HISTORY_RAW_HOURS = float(os.getenv('PCDOCTOR_HISTORY_RAW_HOURS', '24'))
+
+# Fleet mode (shared secret between agents and aggregator, days of snapshots kept)
+FLEET_AGGREGATOR = os.getenv('PCDOCTOR_FLEET_AGGREGATOR', '') == '1'
+FLEET_TOKEN = os.getenv('PCDOCTOR_FLEET_TOKEN', '')
+FLEET_RETENTION_DAYS = float(os.getenv('PCDOCTOR_FLEET_RETENTION_DAYS', '7'))
+
+# Partition usage (seconds to wait per mount, seconds a reading stays fresh,
+# longest quarantine in seconds for a mount that keeps timing out)
+PARTITION_TIMEOUT = float(os.getenv('PCDOCTOR_PARTITION_TIMEOUT', '2'))
+PARTITION_TTL = float(os.getenv('PCDOCTOR_PARTITION_TTL', '10'))
+PARTITION_MAX_QUARANTINE = float(os.getenv('PCDOCTOR_PARTITION_MAX_QUARANTINE', '600'))
+
+# Anomaly detection (z-score that raises an alert, samples the EWMA baseline spans)
+ANOMALY_Z = float(os.getenv('PCDOCTOR_ANOMALY_Z', '4'))
+ANOMALY_SPAN = int(os.getenv('PCDOCTOR_ANOMALY_SPAN', '300'))
+
+# Leak detection (seconds between process checks, hours of growth and MB/h before alerting)
+LEAK_CHECK_INTERVAL = float(os.getenv('PCDOCTOR_LEAK_CHECK_INTERVAL', '60'))
+LEAK_MIN_HOURS = float(os.getenv('PCDOCTOR_LEAK_MIN_HOURS', '1'))
+LEAK_MIN_MB_PER_HOUR = float(os.getenv('PCDOCTOR_LEAK_MIN_MB_PER_HOUR', '50'))
+
+# Memory reclaim (largest targets trimmed, smallest worth trimming in MB, parallel trims)
+RECLAIM_MAX_TARGETS = int(os.getenv('PCDOCTOR_RECLAIM_TARGETS', '10'))
+RECLAIM_MIN_MB = float(os.getenv('PCDOCTOR_RECLAIM_MIN_MB', '50'))
+RECLAIM_WORKERS = int(os.getenv('PCDOCTOR_RECLAIM_WORKERS', '4'))
+
+# Seconds a finished /api/scan result is reused by later scan requests
+SCAN_FRESHNESS = float(os.getenv('PCDOCTOR_SCAN_FRESHNESS', '5'))
+
+# Print and save a startup profile (also: python app.py --profile-startup)
+PROFILE_STARTUP = os.getenv('PCDOCTOR_PROFILE_STARTUP', '') == '1'
+
+# Waitress worker threads in the packaged build (live stats streams hold one each)
+SERVER_THREADS = int(os.getenv('PCDOCTOR_SERVER_THREADS', '32'))
+
+# Most concurrent /api/live streams; the rest of SERVER_THREADS stays free for other requests
+LIVE_MAX_SUBSCRIBERS = int(os.getenv('PCDOCTOR_LIVE_MAX_SUBSCRIBERS', str(max(1, SERVER_THREADS // 2))))
+
+# Default time limit (seconds) for a single diagnostic collector
+COLLECTOR_TIMEOUT = float(os.getenv('PCDOCTOR_COLLECTOR_TIMEOUT', '5'))
+
+# Shared pool for running collectors concurrently
+collector_pool = ThreadPoolExecutor(max_workers=16, thread_name_prefix='collector')
+
+
+# ============================================================================
+# INSTRUMENTATION
+# ============================================================================
+
+class Histogram:
+    """Cumulative-bucket duration histogram in the Prometheus style"""
+    __slots__ = ('counts', 'total', 'count')
+
+    def __init__(self, buckets):
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+
+
+class Metrics:
+    """In-process duration histograms and error counters
+    
+    Recording is a bisect plus a few additions under one lock, so it is
+    cheap enough to leave on for every collector, LLM call and request.
+    """
+
+    BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
 
-class PCDiagnostic:
     def __init__(self):
-        self.data = {}
+        self.histograms = {}
+        self.counters = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name, seconds, labels=()):
+        with self._lock:
+            histogram = self.histograms.get((name, labels))
+            if histogram is None:
+                histogram = self.histograms[(name, labels)] = Histogram(self.BUCKETS)
+            histogram.counts[bisect.bisect_left(self.BUCKETS, seconds)] += 1
+            histogram.total += seconds
+            histogram.count += 1
+
+    def inc(self, name, labels=(), amount=1):
+        with self._lock:
+            self.counters[(name, labels)] = self.counters.get((name, labels), 0) + amount
+
+    @contextmanager
+    def timer(self, kind, name, server_timing=None):
+        """Time a block as pcdoctor_<kind>_duration_seconds{name=...}
         
-    def collect_system_info(self):
-        """Collect basic system information"""
-        self.data['system'] = {
-            'os': platform.system(),
-            'os_version': platform.version(),
-            'processor': platform.processor(),
-            'architecture': platform.machine(),
-            'hostname': platform.node()
-        }
+        Exceptions are counted in pcdoctor_<kind>_errors_total and re-raised.
+        With server_timing set, the duration is also added to the current
+        request's Server-Timing header.
+        """
+        labels = (('name', name),)
+        started = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.inc(f'pcdoctor_{kind}_errors_total', labels + (('reason', 'error'),))
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            self.observe(f'pcdoctor_{kind}_duration_seconds', elapsed, labels)
+            if server_timing:
+                add_server_timing(server_timing, elapsed)
+
+    def render(self, gauges=None):
+        """Render everything in the Prometheus text exposition format"""
+        def fmt(labels, extra=()):
+            pairs = labels + extra
+            if not pairs:
+                return ''
+            escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"') for _, v in pairs)
+            return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
         
-    def collect_cpu_info(self):
-        """Collect CPU usage and information"""
-        cpu_percent = psutil.cpu_percent(interval=1)
-        cpu_freq = psutil.cpu_freq()
+        lines = []
+        with self._lock:
+            histograms = sorted(self.histograms.items())
+            counters = sorted(self.counters.items())
         
-        self.data['cpu'] = {
-            'physical_cores': psutil.cpu_count(logical=False),
-            'total_cores': psutil.cpu_count(logical=True),
-            'current_usage_percent': cpu_percent,
-            'current_frequency_mhz': cpu_freq.current if cpu_freq else 0,
-            'max_frequency_mhz': cpu_freq.max if cpu_freq else 0,
-            'per_core_usage': psutil.cpu_percent(interval=1, percpu=True)
-        }
+        seen = set()
+        for (name, labels), histogram in histograms:
+            if name not in seen:
+                seen.add(name)
+                lines.append(f'# TYPE {name} histogram')
+            cumulative = 0
+            for bound, count in zip(self.BUCKETS, histogram.counts):
+                cumulative += count
+                lines.append(f'{name}_bucket{fmt(labels, (("le", bound),))} {cumulative}')
+            lines.append(f'{name}_bucket{fmt(labels, (("le", "+Inf"),))} {histogram.count}')
+            lines.append(f'{name}_sum{fmt(labels)} {histogram.total:.6f}')
+            lines.append(f'{name}_count{fmt(labels)} {histogram.count}')
         
-    def collect_memory_info(self):
-        """Collect RAM information"""
-        memory = psutil.virtual_memory()
-        swap = psutil.swap_memory()
+        for (name, labels), value in counters:
+            if name not in seen:
+                seen.add(name)
+                lines.append(f'# TYPE {name} counter')
+            lines.append(f'{name}{fmt(labels)} {value}')
         
-        self.data['memory'] = {
-            'total_gb': round(memory.total / (1024**3), 2),
-            'available_gb': round(memory.available / (1024**3), 2),
-            'used_gb': round(memory.used / (1024**3), 2),
-            'usage_percent': memory.percent,
-            'swap_total_gb': round(swap.total / (1024**3), 2),
-            'swap_used_gb': round(swap.used / (1024**3), 2),
-            'swap_percent': swap.percent
-        }
+        for name, value in (gauges or {}).items():
+            lines.append(f'# TYPE {name} gauge')
+            lines.append(f'{name} {value}')
         
-    def collect_disk_info(self):
-        """Collect disk information"""
-        partitions = psutil.disk_partitions()
-        disk_info = []
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics()
+
+
+def add_server_timing(name, seconds):
+    """Add an entry to the current request's Server-Timing header"""
+    if has_request_context():
+        g.setdefault('server_timing', []).append((name, seconds))
+
+
+def timed(kind, name):
+    """Decorator form of metrics.timer for whole functions"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with metrics.timer(kind, name, server_timing=f'{kind}-{name}'):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+
+@app.after_request
+def record_request_timing(response):
+    """Record request duration and attach the Server-Timing breakdown"""
+    started = g.get('request_started')
+    if started is None:
+        return response
+    elapsed = time.perf_counter() - started
+    labels = (('name', request.endpoint or 'unknown'),)
+    metrics.observe('pcdoctor_request_duration_seconds', elapsed, labels)
+    if response.status_code >= 500:
+        metrics.inc('pcdoctor_request_errors_total', labels)
+    
+    # Streamed responses only include what was measured before the headers
+    entries = g.get('server_timing', []) + [('total', elapsed)]
+    response.headers['Server-Timing'] = ', '.join(
+        f'{name};dur={seconds * 1000:.1f}' for name, seconds in entries)
+    return response
+
+
+@app.after_request
+def add_conditional_headers(response):
+    """ETag JSON GET responses and answer a matching If-None-Match with 304"""
+    if (request.method in ('GET', 'HEAD') and response.status_code == 200
+            and response.mimetype == 'application/json' and not response.is_streamed):
+        response.add_etag()
+        response.headers.setdefault('Cache-Control', 'no-cache')
+        response.make_conditional(request)
+    return response
+
+
+# ============================================================================
+# PARTITION MONITOR
+# ============================================================================
+
+# Drive used for the headline disk figure
+SYSTEM_MOUNT = (os.environ.get('SystemDrive', 'C:') + '\\') if platform.system() == 'Windows' else '/'
+
+
+class MountState:
+    """Cached usage of one mount and the state of its refreshes"""
+    __slots__ = ('usage', 'fetched_at', 'future', 'failures', 'quarantined_until', 'error')
+
+    def __init__(self):
+        self.usage = None
+        self.fetched_at = 0.0
+        self.future = None
+        self.failures = 0
+        self.quarantined_until = 0.0
+        self.error = None
+
+
+class PartitionMonitor:
+    """Partition usage that a hung mount cannot block
+    
+    Each mount is queried on its own short-lived thread, at most one query
+    per mount at a time, so hung mounts never queue healthy ones behind
+    them. Callers get the cached reading while it is fresh, the
+    stale reading (marked as such) while a refresh runs in the background,
+    and wait at most `timeout` only for mounts never read before. A mount
+    that times out is quarantined, doubling each time up to
+    PARTITION_MAX_QUARANTINE, and is retried once the stuck query returns.
+    
+    The partition listing and SYSTEM_MOUNT run on a separate small pool.
+    Mounts that have failed before are not retried while MAX_HUNG queries
+    are stuck, which bounds the threads that flapping mounts can hold.
+    """
+
+    BASE_QUARANTINE = 15.0
+    MAX_HUNG = 8
+
+    def __init__(self, timeout=PARTITION_TIMEOUT, ttl=PARTITION_TTL, max_quarantine=PARTITION_MAX_QUARANTINE):
+        self.timeout = timeout
+        self.ttl = ttl
+        self.max_quarantine = max_quarantine
+        self.mounts = {}
+        self._partitions = []
+        self._partitions_at = 0.0
+        self._partitions_future = None
+        # Mounts whose query timed out and is still holding a pool thread
+        self._hung = set()
+        self._system_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix='partition-system')
+        self._lock = threading.Lock()
+
+    def _state(self, mountpoint):
+        state = self.mounts.get(mountpoint)
+        if state is None:
+            state = self.mounts[mountpoint] = MountState()
+        return state
+
+    def _finished(self, mountpoint, future):
+        """Done-callback: store a completed query, even one that arrived after its timeout"""
+        with self._lock:
+            state = self._state(mountpoint)
+            state.future = None
+            self._hung.discard(mountpoint)
+            try:
+                state.usage = future.result()
+                state.fetched_at = time.monotonic()
+                state.failures = 0
+                state.quarantined_until = 0.0
+                state.error = None
+            except Exception as e:
+                state.error = str(e)
+
+    @staticmethod
+    def _query(mountpoint, future):
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(psutil.disk_usage(mountpoint))
+        except Exception as e:
+            future.set_exception(e)
+
+    def _refresh(self, mountpoint, now):
+        """Future of the mount's running or newly started query; None while quarantined"""
+        with self._lock:
+            state = self._state(mountpoint)
+            if now < state.quarantined_until:
+                return None
+            if state.future is not None:
+                return state.future
+            if mountpoint == SYSTEM_MOUNT:
+                future = state.future = self._system_pool.submit(psutil.disk_usage, mountpoint)
+            elif state.failures and len(self._hung) >= self.MAX_HUNG:
+                # Too many threads are stuck already; don't risk another on a mount known to hang
+                return None
+            else:
+                future = state.future = Future()
+                threading.Thread(target=self._query, args=(mountpoint, future),
+                                 name='partition-usage', daemon=True).start()
+        future.add_done_callback(lambda f: self._finished(mountpoint, f))
+        return future
+
+    def _timed_out(self, mountpoint):
+        now = time.monotonic()
+        with self._lock:
+            state = self._state(mountpoint)
+            state.failures += 1
+            state.quarantined_until = now + min(self.BASE_QUARANTINE * 2 ** (state.failures - 1), self.max_quarantine)
+            state.error = f'no response within {self.timeout:g}s'
+            if state.future is not None and not state.future.done():
+                self._hung.add(mountpoint)
+        metrics.inc('pcdoctor_partition_timeouts_total')
+
+    def partitions(self):
+        """Mounted partitions, re-listed in the background at most every ttl seconds"""
+        now = time.monotonic()
+        future = self._partitions_future
+        if future is None and now - self._partitions_at >= self.ttl:
+            future = self._partitions_future = self._system_pool.submit(psutil.disk_partitions)
+        if future is not None:
+            try:
+                # Only the very first listing is worth waiting for
+                self._partitions = future.result(timeout=self.timeout if not self._partitions else 0)
+                self._partitions_at = now
+                self._partitions_future = None
+            except TimeoutError:
+                pass
+            except OSError:
+                self._partitions_future = None
+                self._partitions_at = now
+        return self._partitions
+
+    def usage(self, mountpoint, wait=0):
+        """Cached usage of one mount, refreshed in the background when old
         
-        for partition in partitions:
+        Waits up to `wait` seconds only if the mount has never been read.
+        """
+        now = time.monotonic()
+        state = self._state(mountpoint)
+        if state.usage is not None and now - state.fetched_at < self.ttl:
+            return state.usage
+        future = self._refresh(mountpoint, now)
+        if state.usage is None and future is not None and wait > 0:
             try:
-                usage = psutil.disk_usage(partition.mountpoint)
-                disk_info.append({
-                    'device': partition.device,
-                    'mountpoint': partition.mountpoint,
-                    'filesystem': partition.fstype,
-                    'total_gb': round(usage.total / (1024**3), 2),
-                    'used_gb': round(usage.used / (1024**3), 2),
-                    'free_gb': round(usage.free / (1024**3), 2),
-                    'usage_percent': usage.percent
-                })
-            except PermissionError:
-                continue
-                
-        disk_io = psutil.disk_io_counters()
+                return future.result(timeout=wait)
+            except TimeoutError:
+                self._timed_out(mountpoint)
+            except OSError:
+                pass
+        return state.usage
+
+    def collect(self):
+        """Usage of every partition, waiting at most `timeout` in total"""
+        now = time.monotonic()
+        partitions = self.partitions()
+        pending = {}
+        for partition in partitions:
+            state = self._state(partition.mountpoint)
+            if state.usage is None or now - state.fetched_at >= self.ttl:
+                future = self._refresh(partition.mountpoint, now)
+                if state.usage is None and future is not None:
+                    pending[future] = partition.mountpoint
         
-        self.data['disk'] = {
-            'partitions': disk_info,
-            'io_counters': {
-                'read_mb': round(disk_io.read_bytes / (1024**2), 2),
-                'write_mb': round(disk_io.write_bytes / (1024**2), 2),
-                'read_count': disk_io.read_count,
-                'write_count': disk_io.write_count
-            } if disk_io else {}
-        }
+        # Mounts with a stale reading keep refreshing in the background;
+        # only never-read mounts are waited for, all in parallel
+        if pending:
+            done, not_done = wait(pending, timeout=self.timeout)
+            for future in not_done:
+                self._timed_out(pending[future])
         
-    def collect_process_info(self):
-        """Collect top resource-consuming processes"""
-        processes = []
-        for proc in psutil.process_iter(['pid', 'name', 'cpu_percent', 'memory_percent', 'status']):
-            try:
-                processes.append({
-                    'pid': proc.info['pid'],
-                    'name': proc.info['name'],
-                    'cpu_percent': proc.info['cpu_percent'],
-                    'memory_percent': round(proc.info['memory_percent'], 2),
-                    'status': proc.info['status']
-                })
-            except (psutil.NoSuchProcess, psutil.AccessDenied):
+        available = []
+        unavailable = []
+        now = time.monotonic()
+        for partition in partitions:
+            state = self._state(partition.mountpoint)
+            if state.usage is None:
+                if now < state.quarantined_until or state.error:
+                    unavailable.append({
+                        'device': partition.device,
+                        'mountpoint': partition.mountpoint,
+                        'error': state.error,
+                        'quarantined': now < state.quarantined_until
+                    })
                 continue
+            usage = state.usage
+            age = now - state.fetched_at
+            available.append({
+                'device': partition.device,
+                'mountpoint': partition.mountpoint,
+                'filesystem': partition.fstype,
+                'total_gb': round(usage.total / (1024**3), 2),
+                'used_gb': round(usage.used / (1024**3), 2),
+                'free_gb': round(usage.free / (1024**3), 2),
+                'usage_percent': usage.percent,
+                'stale': age >= self.ttl,
+                'age_s': round(age, 1)
+            })
+        return available, unavailable
+
+
+partition_monitor = PartitionMonitor()
+
+
+# ============================================================================
+# BACKGROUND METRIC SAMPLER
+# ============================================================================
+
+MetricSample = namedtuple('MetricSample', [
+    'timestamp', 'cpu_percent', 'per_core_usage', 'memory', 'swap',
+    'disk_usage', 'disk_io', 'net_io', 'per_disk_io', 'per_nic_io'
+])
+
+# Counter fields turned into per-second rates
+DISK_RATE_FIELDS = ['read_bytes', 'write_bytes', 'read_count', 'write_count', 'busy_time']
+NIC_RATE_FIELDS = ['bytes_sent', 'bytes_recv', 'packets_sent', 'packets_recv',
+                   'errin', 'errout', 'dropin', 'dropout']
+
+
+def counter_delta(current, previous):
+    """Difference between two readings of a monotonic counter
+    
+    A smaller current value means the counter either wrapped (32-bit
+    counters on some drivers) or was reset (device re-attached). A wrap is
+    assumed when the previous value fits in 32 bits; otherwise the counter
+    restarted from zero and the current value is the delta.
+    """
+    delta = current - previous
+    if delta >= 0:
+        return delta
+    if previous < 2**32:
+        return current + 2**32 - previous
+    return current
+
+
+def counter_rates(current, previous, elapsed, fields):
+    """Per-second rates for the given fields of two psutil counter tuples"""
+    return {
+        field: counter_delta(getattr(current, field), getattr(previous, field)) / elapsed
+        for field in fields if hasattr(current, field)
+    }
+
+
+class MetricSampler:
+    """Sample system metrics on a background thread into a ring buffer
+
+    psutil.cpu_percent(interval=None) measures the time since the previous
+    call, so one long-lived thread calling it at a fixed rate gives real
+    usage figures without any request ever having to sleep.
+    """
+
+    def __init__(self, interval=SAMPLE_INTERVAL, history=SAMPLE_HISTORY):
+        self.interval = interval
+        self.samples = deque(maxlen=history)
+        self.listeners = []
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """Start the sampler thread (no-op if it is already running)"""
+        with self._lock:
+            if self.running:
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='metric-sampler', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Stop the sampler thread"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval + 1)
+
+    def _run(self):
+        # Prime the CPU counters, then take the first sample quickly so
+        # readers are not kept waiting for a full interval after startup
+        psutil.cpu_percent(interval=None)
+        psutil.cpu_percent(interval=None, percpu=True)
+        delay = min(self.interval, 0.1)
+        while not self._stop.wait(delay):
+            try:
+                self.sample()
+            except Exception:
+                pass
+            delay = self.interval
+
+    def sample(self):
+        """Take one sample and append it to the ring buffer"""
+        # Cached system drive usage; a slow drive never delays the sample,
+        # except that the first one waits (bounded) for the first reading
+        disk_usage = partition_monitor.usage(SYSTEM_MOUNT, wait=0 if self.samples else partition_monitor.timeout)
+
+        sample = MetricSample(
+            timestamp=time.time(),
+            cpu_percent=psutil.cpu_percent(interval=None),
+            per_core_usage=psutil.cpu_percent(interval=None, percpu=True),
+            memory=psutil.virtual_memory(),
+            swap=psutil.swap_memory(),
+            disk_usage=disk_usage,
+            disk_io=psutil.disk_io_counters(),
+            net_io=psutil.net_io_counters(),
+            per_disk_io=psutil.disk_io_counters(perdisk=True) or {},
+            per_nic_io=psutil.net_io_counters(pernic=True) or {}
+        )
+        self.samples.append(sample)
+        self._ready.set()
         
-        # Sort by CPU usage and get top 10
-        top_cpu = sorted(processes, key=lambda x: x['cpu_percent'] or 0, reverse=True)[:10]
-        # Sort by memory usage and get top 10
-        top_memory = sorted(processes, key=lambda x: x['memory_percent'] or 0, reverse=True)[:10]
-        
-        self.data['processes'] = {
-            'total_running': len(processes),
-            'top_cpu_consumers': top_cpu,
-            'top_memory_consumers': top_memory
-        }
+        for listener in self.listeners:
+            try:
+                listener(sample)
+            except Exception:
+                pass
+        return sample
+    
+    def add_listener(self, listener):
+        """Call listener(sample) on the sampler thread after every sample"""
+        if listener not in self.listeners:
+            self.listeners.append(listener)
+
+    def latest(self):
+        """Return the most recent sample without blocking on psutil"""
+        if not self.running:
+            self.start()
+        # Only the very first read after startup waits, for the priming sample
+        self._ready.wait(timeout=self.interval + 1)
+        try:
+            return self.samples[-1]
+        except IndexError:
+            return self.sample()
+
+    def rates(self, window=RATE_WINDOW):
+        """Per-disk and per-NIC rates over roughly the last `window` seconds
         
-    def collect_network_info(self):
-        """Collect network information"""
-        net_io = psutil.net_io_counters()
+        Computed from counters already in the ring buffer, so this never
+        waits for a new sample.
+        """
+        current = self.latest()
+        previous = None
+        # Iterate a copy: the sampler thread appends (and evicts) while we walk
+        for sample in reversed(list(self.samples)):
+            previous = sample
+            if current.timestamp - sample.timestamp >= window:
+                break
+        elapsed = current.timestamp - previous.timestamp if previous else 0
+        if elapsed <= 0:
+            return {'window_s': 0, 'disks': {}, 'interfaces': {}}
         
-        self.data['network'] = {
-            'bytes_sent_mb': round(net_io.bytes_sent / (1024**2), 2),
-            'bytes_received_mb': round(net_io.bytes_recv / (1024**2), 2),
-            'packets_sent': net_io.packets_sent,
-            'packets_received': net_io.packets_recv
-        }
+        disks = {}
+        for name, counters in current.per_disk_io.items():
+            if name.startswith(('loop', 'ram')) or name not in previous.per_disk_io:
+                continue
+            rate = counter_rates(counters, previous.per_disk_io[name], elapsed, DISK_RATE_FIELDS)
+            disks[name] = {
+                'read_mb_per_s': round(rate['read_bytes'] / (1024**2), 3),
+                'write_mb_per_s': round(rate['write_bytes'] / (1024**2), 3),
+                'read_iops': round(rate['read_count'], 1),
+                'write_iops': round(rate['write_count'], 1)
+            }
+            if 'busy_time' in rate:
+                # busy_time is in milliseconds (Linux and FreeBSD only)
+                disks[name]['busy_percent'] = round(min(100.0, rate['busy_time'] / 10), 1)
         
-    def collect_boot_info(self):
-        """Collect boot time information"""
-        boot_time = datetime.fromtimestamp(psutil.boot_time())
-        uptime_seconds = time.time() - psutil.boot_time()
+        interfaces = {}
+        for name, counters in current.per_nic_io.items():
+            if name not in previous.per_nic_io:
+                continue
+            rate = counter_rates(counters, previous.per_nic_io[name], elapsed, NIC_RATE_FIELDS)
+            interfaces[name] = {
+                'sent_mb_per_s': round(rate['bytes_sent'] / (1024**2), 3),
+                'received_mb_per_s': round(rate['bytes_recv'] / (1024**2), 3),
+                'packets_sent_per_s': round(rate['packets_sent'], 1),
+                'packets_received_per_s': round(rate['packets_recv'], 1),
+                'errors_per_s': round(rate['errin'] + rate['errout'], 2),
+                'drops_per_s': round(rate['dropin'] + rate['dropout'], 2)
+            }
         
-        self.data['boot'] = {
-            'boot_time': boot_time.strftime("%Y-%m-%d %H:%M:%S"),
-            'uptime_hours': round(uptime_seconds / 3600, 2)
+        return {'window_s': round(elapsed, 2), 'disks': disks, 'interfaces': interfaces}
+    
+    def history(self, seconds=None):
+        """Return buffered samples, optionally limited to the last N seconds"""
+        samples = list(self.samples)
+        if seconds is None:
+            return samples
+        cutoff = time.time() - seconds
+        return [s for s in samples if s.timestamp >= cutoff]
+
+
+sampler = MetricSampler()
+
+
+# ============================================================================
+# PROCESS TABLE
+# ============================================================================
+
+class ProcessEntry:
+    """Compact cached state for one live process"""
+    __slots__ = ('pid', 'create_time', 'ppid', 'exe', 'name', 'status', 'cpu_time',
+                 'sampled_at', 'cpu_percent', 'memory_percent', 'rss',
+                 'io_bytes', 'read_rate', 'write_rate')
+
+    def __init__(self, pid, create_time):
+        self.pid = pid
+        self.create_time = create_time
+        self.ppid = None
+        self.exe = None
+        self.name = None
+        self.status = None
+        self.cpu_time = None
+        self.sampled_at = None
+        self.cpu_percent = 0.0
+        self.memory_percent = 0.0
+        self.rss = 0
+        self.io_bytes = None
+        self.read_rate = 0.0
+        self.write_rate = 0.0
+
+    def to_dict(self):
+        return {
+            'pid': self.pid,
+            'name': self.name,
+            'cpu_percent': round(self.cpu_percent, 1),
+            'memory_percent': round(self.memory_percent, 2),
+            'status': self.status
         }
-        
-    def collect_all_diagnostics(self):
-        """Run all diagnostic collections"""
-        self.collect_system_info()
-        self.collect_cpu_info()
-        self.collect_memory_info()
-        self.collect_disk_info()
-        self.collect_process_info()
-        self.collect_network_info()
-        self.collect_boot_info()
-        
-        return self.data
+
+
+class ProcessTable:
+    """Long-lived process table keyed by (pid, create_time)
+
+    CPU usage is computed from the change in each process's CPU time since
+    the previous refresh, so it is correct from the second refresh onwards
+    instead of always reading 0.0 from a fresh process_iter. Keying on
+    create_time as well as pid stops a recycled pid inheriting the CPU
+    history of the process that used it before.
+    """
+
+    ATTRS = ['pid', 'ppid', 'name', 'create_time', 'status', 'cpu_times', 'memory_info',
+             'memory_percent', 'io_counters']
+
+    def __init__(self, min_refresh_interval=1.0):
+        self.entries = {}
+        self.min_refresh_interval = min_refresh_interval
+        self.last_refresh = 0.0
+        self._lock = threading.Lock()
+
+    def refresh(self, force=False):
+        """Update every entry from psutil and evict processes that have exited"""
+        with self._lock:
+            now = time.monotonic()
+            if not force and now - self.last_refresh < self.min_refresh_interval:
+                return
+            
+            live = set()
+            for proc in psutil.process_iter(self.ATTRS):
+                try:
+                    info = proc.info
+                    key = (info['pid'], info['create_time'])
+                    entry = self.entries.get(key)
+                    if entry is None:
+                        entry = self.entries[key] = ProcessEntry(info['pid'], info['create_time'])
+                        # The executable never changes, so it is looked up once per process
+                        try:
+                            entry.exe = proc.exe()
+                        except (psutil.Error, OSError):
+                            entry.exe = ''
+                    
+                    elapsed = now - entry.sampled_at if entry.sampled_at is not None else 0
+                    cpu_times = info['cpu_times']
+                    if cpu_times is not None:
+                        cpu_time = cpu_times.user + cpu_times.system
+                        if entry.cpu_time is not None and elapsed > 0:
+                            delta = max(0.0, cpu_time - entry.cpu_time)
+                            entry.cpu_percent = delta / elapsed * 100
+                        entry.cpu_time = cpu_time
+                    
+                    io = info['io_counters']
+                    if io is not None:
+                        if entry.io_bytes is not None and elapsed > 0:
+                            entry.read_rate = max(0, io.read_bytes - entry.io_bytes[0]) / elapsed
+                            entry.write_rate = max(0, io.write_bytes - entry.io_bytes[1]) / elapsed
+                        entry.io_bytes = (io.read_bytes, io.write_bytes)
+                    entry.sampled_at = now
+                    entry.ppid = info['ppid']
+                    
+                    entry.name = info['name']
+                    entry.status = info['status']
+                    entry.memory_percent = info['memory_percent'] or 0.0
+                    entry.rss = info['memory_info'].rss if info['memory_info'] else 0
+                    live.add(key)
+                except (psutil.NoSuchProcess, psutil.AccessDenied):
+                    continue
+            
+            for key in self.entries.keys() - live:
+                del self.entries[key]
+            self.last_refresh = now
+
+    def top(self, n=10, key='cpu_percent'):
+        """Return the N entries with the highest value of `key`"""
+        with self._lock:
+            entries = list(self.entries.values())
+        return heapq.nlargest(n, entries, key=lambda e: getattr(e, key) or 0)
+
+    def items(self):
+        """((pid, create_time), entry) pairs, copied under the lock"""
+        with self._lock:
+            return list(self.entries.items())
+
+    def __len__(self):
+        return len(self.entries)
+
+
+process_table = ProcessTable()
+
+
+# ============================================================================
+# APP GROUPS
+# ============================================================================
+
+# Processes that must never be ended, alone or as part of an app group
+CRITICAL_PROCESSES = ['System', 'csrss.exe', 'smss.exe', 'services.exe',
+                      'svchost.exe', 'lsass.exe', 'winlogon.exe', 'dwm.exe']
+
+# Per-process columns summed into each app, as (column, ProcessEntry attribute)
+APP_COLUMNS = [('cpu_percent', 'cpu_percent'), ('memory_percent', 'memory_percent'),
+               ('rss', 'rss'), ('read_rate', 'read_rate'), ('write_rate', 'write_rate')]
+
+APP_SORTS = {'memory': 'rss', 'cpu': 'cpu_percent', 'io': 'io_rate'}
+
+
+# OS folders whose subfolders hold unrelated programs, not one app's helpers
+SYSTEM_DIRS = [os.path.normcase(os.environ.get('SystemRoot', r'C:\Windows')),
+               '/bin', '/sbin', '/usr', '/lib', '/lib64', '/etc', '/System', '/Library']
+
+
+def _is_install_dir(path):
+    """True for a folder an app could own: not an OS folder and not a top-level one"""
+    path = os.path.normcase(path)
+    if any(path == d or path.startswith(d.rstrip(os.sep) + os.sep) for d in SYSTEM_DIRS):
+        return False
+    # Something like C:\Program Files\Vendor or /opt/vendor, not C:\Windows or /win
+    drive, rest = os.path.splitdrive(path)
+    return len([part for part in rest.split(os.sep) if part]) >= 2
+
+
+def _same_app(child, parent):
+    """True if child is a helper of parent: the same executable, or one installed beneath it"""
+    if child.exe and parent.exe:
+        if child.exe == parent.exe:
+            return True
+        # Helpers shipped in a subfolder of the app's own install folder
+        app_dir = os.path.dirname(parent.exe)
+        prefix = app_dir + os.sep
+        return (_is_install_dir(app_dir) and child.exe.startswith(prefix)
+                and os.sep in child.exe[len(prefix):])
+    return not child.exe and not parent.exe and child.name == parent.name
+
+
+def _app_root(entry, by_pid, roots):
+    """Topmost ancestor reachable through _same_app links, memoized in roots"""
+    chain = []
+    while entry.pid not in roots:
+        parent = by_pid.get(entry.ppid)
+        chain.append(entry)
+        # A parent younger than its child means the ppid has been reused
+        if (parent is None or parent is entry or parent in chain
+                or (parent.create_time or 0) > (entry.create_time or 0) or not _same_app(entry, parent)):
+            root = entry
+            break
+        entry = parent
+    else:
+        root = roots[entry.pid]
+    for member in chain:
+        roots[member.pid] = root
+    return root
+
+
+def _group_sum(groups, column, count):
+    """Sum a value column into `count` buckets by the parallel group-index column"""
+    totals = [0.0] * count
+    for group, value in zip(groups, column):
+        totals[group] += value
+    return totals
+
+
+def aggregate_apps(entries):
+    """Group process entries into apps by executable and parent tree
     
-    def analyze_with_gemini(self):
-        """Send diagnostic data to Gemini for structured analysis"""
-        model = genai.GenerativeModel('gemini-2.5-flash-lite')
-        
-        prompt = f"""You are a PC performance expert. Analyze this system diagnostic data and provide a structured response.
+    Each process joins its topmost same-app ancestor, and all trees of the
+    same executable form one app, so a browser's dozens of processes show
+    up as a single line. Values are gathered into flat typed columns and
+    summed per group in one pass each.
+    """
+    by_pid = {entry.pid: entry for entry in entries}
+    roots = {}
+    keys = {}
+    apps = []
+    groups = array('l')
+    columns = {name: array('d') for name, _ in APP_COLUMNS}
+    
+    for entry in entries:
+        root = _app_root(entry, by_pid, roots)
+        key = root.exe or root.name
+        group = keys.get(key)
+        if group is None:
+            group = keys[key] = len(apps)
+            apps.append({'name': root.name, 'exe': root.exe, 'root_pid': root.pid, 'members': []})
+        apps[group]['members'].append(entry)
+        groups.append(group)
+        for name, attribute in APP_COLUMNS:
+            columns[name].append(getattr(entry, attribute) or 0)
+    
+    totals = {name: _group_sum(groups, column, len(apps)) for name, column in columns.items()}
+    for group, app_info in enumerate(apps):
+        for name in columns:
+            app_info[name] = totals[name][group]
+        app_info['io_rate'] = app_info['read_rate'] + app_info['write_rate']
+    return apps
 
-System Diagnostic Data:
-{json.dumps(self.data, indent=2)}
 
-Respond with a JSON object in this EXACT format (no markdown, no extra text):
-{{
-  "health_score": 85,
-  "health_status": "Good",
-  "critical_issues": [
-    {{"title": "Issue title", "description": "Brief description", "severity": "high/medium/low"}}
-  ],
-  "performance_bottlenecks": [
-    {{"component": "RAM/CPU/Disk", "current_value": "10GB", "description": "Why this is a bottleneck"}}
-  ],
-  "recommendations": [
-    {{
-      "title": "Recommendation title",
-      "description": "Detailed explanation",
-      "impact": "High/Medium/Low",
-      "steps": ["Step 1", "Step 2", "Step 3"]
+def app_to_dict(app_info, max_pids=20):
+    members = sorted(app_info['members'], key=lambda e: -(e.rss or 0))
+    return {
+        'name': app_info['name'],
+        'exe': app_info['exe'],
+        'root_pid': app_info['root_pid'],
+        'process_count': len(members),
+        'pids': [entry.pid for entry in members[:max_pids]],
+        'cpu_percent': round(app_info['cpu_percent'], 1),
+        'memory_percent': round(app_info['memory_percent'], 2),
+        'rss_mb': round(app_info['rss'] / (1024**2), 1),
+        'read_mbps': round(app_info['read_rate'] / (1024**2), 3),
+        'write_mbps': round(app_info['write_rate'] / (1024**2), 3),
+    }
+
+
+def top_apps(n=10, sort='memory'):
+    """The N largest apps from the process table"""
+    process_table.refresh()
+    apps = aggregate_apps([entry for _, entry in process_table.items()])
+    key = APP_SORTS.get(sort, 'rss')
+    return heapq.nlargest(n, apps, key=lambda a: a[key])
+
+
+def _uss(pid):
+    try:
+        return psutil.Process(pid).memory_full_info().uss
+    except (psutil.Error, AttributeError, OSError):
+        return 0
+
+
+# ============================================================================
+# METRIC HISTORY
+# ============================================================================
+
+HISTORY_METRICS = [
+    'cpu_percent', 'memory_percent', 'swap_percent', 'disk_percent',
+    'disk_read_mbps', 'disk_write_mbps', 'net_sent_mbps', 'net_recv_mbps'
+]
+
+
+def sample_values(sample, previous):
+    """Named scalar metrics for a sample, with throughput since `previous`"""
+    elapsed = sample.timestamp - previous.timestamp if previous else 0
+    def rate(current, last, field):
+        if current is None or last is None or elapsed <= 0:
+            return 0.0
+        return counter_delta(getattr(current, field), getattr(last, field)) / elapsed / (1024**2)
+    
+    last_disk = previous.disk_io if previous else None
+    last_net = previous.net_io if previous else None
+    return {
+        'cpu_percent': sample.cpu_percent,
+        'memory_percent': sample.memory.percent,
+        'swap_percent': sample.swap.percent,
+        # None until the system drive has answered, rather than a false 0%
+        'disk_percent': sample.disk_usage.percent if sample.disk_usage else None,
+        'disk_read_mbps': rate(sample.disk_io, last_disk, 'read_bytes'),
+        'disk_write_mbps': rate(sample.disk_io, last_disk, 'write_bytes'),
+        'net_sent_mbps': rate(sample.net_io, last_net, 'bytes_sent'),
+        'net_recv_mbps': rate(sample.net_io, last_net, 'bytes_recv'),
+    }
+
+
+class RingFile:
+    """Fixed-width records in a memory-mapped circular file
+    
+    Records are appended in time order, so the oldest record is at `head`
+    once the file is full and any time range can be found by binary search
+    on the timestamps without reading the rest of the file.
+    """
+
+    HEADER = struct.Struct('<4sHHIIII')
+    MAGIC = b'PCDH'
+    VERSION = 1
+
+    def __init__(self, path, record_format, capacity, fields):
+        self.path = path
+        self.record = struct.Struct(record_format)
+        self.capacity = capacity
+        self.fields = fields
+        self._lock = threading.Lock()
+        size = self.HEADER.size + self.record.size * capacity
+        
+        if not self._matches(path, size):
+            # New file, or one written with a different layout
+            with open(path, 'wb') as f:
+                f.truncate(size)
+            self._file = open(path, 'r+b')
+            self._mm = mmap.mmap(self._file.fileno(), size)
+            self.head = self.count = 0
+            self._write_header()
+        else:
+            self._file = open(path, 'r+b')
+            self._mm = mmap.mmap(self._file.fileno(), size)
+            _, _, _, _, _, self.head, self.count = self.HEADER.unpack_from(self._mm, 0)
+
+    def _matches(self, path, size):
+        try:
+            if os.path.getsize(path) != size:
+                return False
+            with open(path, 'rb') as f:
+                magic, version, fields, capacity, record_size, _, _ = self.HEADER.unpack(f.read(self.HEADER.size))
+        except (OSError, struct.error):
+            return False
+        return (magic, version, fields, capacity, record_size) == \
+            (self.MAGIC, self.VERSION, self.fields, self.capacity, self.record.size)
+
+    def _write_header(self):
+        self.HEADER.pack_into(self._mm, 0, self.MAGIC, self.VERSION, self.fields,
+                              self.capacity, self.record.size, self.head, self.count)
+
+    def _offset(self, index):
+        """Byte offset of the index-th oldest record"""
+        start = (self.head - self.count) % self.capacity
+        return self.HEADER.size + ((start + index) % self.capacity) * self.record.size
+
+    def append(self, values):
+        with self._lock:
+            offset = self.HEADER.size + self.head * self.record.size
+            self.record.pack_into(self._mm, offset, *values)
+            self.head = (self.head + 1) % self.capacity
+            self.count = min(self.count + 1, self.capacity)
+            self._write_header()
+
+    def read(self, start, end, max_points):
+        """Return records with start <= timestamp <= end, thinned to max_points"""
+        with self._lock:
+            timestamp_at = lambda i: struct.unpack_from('<d', self._mm, self._offset(i))[0]
+            lo = bisect.bisect_left(_IndexView(self.count, timestamp_at), start)
+            hi = bisect.bisect_right(_IndexView(self.count, timestamp_at), end)
+            step = max(1, -(-(hi - lo) // max_points))
+            return [self.record.unpack_from(self._mm, self._offset(i)) for i in range(lo, hi, step)]
+
+    def flush(self):
+        self._mm.flush()
+
+
+class _IndexView:
+    """Sequence view over a RingFile's timestamps, for bisect"""
+
+    def __init__(self, length, getter):
+        self.length = length
+        self.getter = getter
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, index):
+        return self.getter(index)
+
+
+class _Rollup:
+    """Running min/mean/max of every metric within one time bucket"""
+    __slots__ = ('bucket', 'count', 'mins', 'maxs', 'sums')
+
+    def __init__(self, bucket, size):
+        self.bucket = bucket
+        self.count = 0
+        self.mins = [float('inf')] * size
+        self.maxs = [float('-inf')] * size
+        self.sums = [0.0] * size
+
+    def add(self, values):
+        self.count += 1
+        for i, value in enumerate(values):
+            self.sums[i] += value
+            if value < self.mins[i]:
+                self.mins[i] = value
+            if value > self.maxs[i]:
+                self.maxs[i] = value
+
+    def record(self):
+        values = [self.bucket, self.count]
+        for i in range(len(self.sums)):
+            values.extend((self.mins[i], self.sums[i] / self.count, self.maxs[i]))
+        return values
+
+
+class HistoryStore:
+    """Bounded on-disk metric history with minute and hour rollups
+    
+    Raw samples go into one ring file and per-minute and per-hour
+    min/mean/max aggregates into two more. Each file has a fixed size, so
+    disk and memory use stay flat no matter how long sampling runs.
+    """
+
+    # Rollup tiers: name -> (bucket seconds, records kept)
+    ROLLUPS = {
+        'minute': (60, 7 * 24 * 60),
+        'hour': (3600, 365 * 24),
+    }
+
+    def __init__(self, directory=None, metrics=HISTORY_METRICS,
+                 interval=HISTORY_INTERVAL, raw_hours=HISTORY_RAW_HOURS):
+        self.directory = directory or os.path.join(DATA_DIR, 'history')
+        self.metrics = metrics
+        self.interval = interval
+        self.raw_capacity = max(1, int(raw_hours * 3600 / interval))
+        self.rings = None
+        self._rollups = {}
+        self._previous = None
+        self._last_recorded = 0.0
+        self._lock = threading.Lock()
+
+    def open(self):
+        with self._lock:
+            if self.rings is not None:
+                return
+            os.makedirs(self.directory, exist_ok=True)
+            n = len(self.metrics)
+            rings = {'raw': RingFile(os.path.join(self.directory, 'raw.bin'),
+                                     '<d' + 'f' * n, self.raw_capacity, n)}
+            for tier, (_, capacity) in self.ROLLUPS.items():
+                rings[tier] = RingFile(os.path.join(self.directory, f'{tier}.bin'),
+                                       '<dI' + 'fff' * n, capacity, n)
+            self.rings = rings
+
+    def record(self, timestamp, values):
+        """Store one raw sample and fold it into the rollups"""
+        self.open()
+        self.rings['raw'].append([timestamp] + list(values))
+        
+        for tier, (period, _) in self.ROLLUPS.items():
+            bucket = timestamp - timestamp % period
+            rollup = self._rollups.get(tier)
+            if rollup is not None and rollup.bucket != bucket:
+                self.rings[tier].append(rollup.record())
+                self.rings[tier].flush()
+                rollup = None
+            if rollup is None:
+                rollup = self._rollups[tier] = _Rollup(bucket, len(self.metrics))
+            rollup.add(values)
+
+    def on_sample(self, sample):
+        """Sampler listener: record a sample every `interval` seconds"""
+        previous = self._previous
+        if previous is not None and sample.timestamp - self._last_recorded < self.interval:
+            return
+        self._previous = sample
+        if previous is None:
+            # Throughput needs two samples
+            return
+        
+        values = sample_values(sample, previous)
+        self._last_recorded = sample.timestamp
+        # Missing readings are stored as NaN and come back from query() as null
+        self.record(sample.timestamp, [math.nan if values[name] is None else values[name] for name in self.metrics])
+
+    def query(self, metric, seconds, end=None, max_points=500):
+        """Return a metric's values over the last `seconds`, at a suitable resolution"""
+        self.open()
+        index = self.metrics.index(metric)
+        end = end or time.time()
+        start = end - seconds
+        
+        # Use the finest tier that still covers the requested range
+        if seconds <= self.raw_capacity * self.interval:
+            resolution = 'raw'
+        elif seconds <= self.ROLLUPS['minute'][0] * self.ROLLUPS['minute'][1]:
+            resolution = 'minute'
+        else:
+            resolution = 'hour'
+        
+        records = self.rings[resolution].read(start, end, max_points)
+        result = {
+            'metric': metric,
+            'resolution': resolution,
+            'timestamps': [round(r[0], 3) for r in records]
+        }
+        def value(v):
+            return round(v, 2) if math.isfinite(v) else None
+        
+        if resolution == 'raw':
+            result['values'] = [value(r[1 + index]) for r in records]
+        else:
+            base = 2 + index * 3
+            result['min'] = [value(r[base]) for r in records]
+            result['values'] = [value(r[base + 1]) for r in records]
+            result['max'] = [value(r[base + 2]) for r in records]
+        return result
+
+
+history_store = HistoryStore()
+
+
+def parse_duration(text):
+    """Parse durations like '90s', '15m', '6h' or '7d' into seconds"""
+    units = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 604800}
+    text = (text or '').strip().lower()
+    if text[-1:] in units:
+        return float(text[:-1]) * units[text[-1]]
+    return float(text)
+
+
+# ============================================================================
+# LIVE STATS BROADCAST
+# ============================================================================
+
+LIVE_METRICS = HISTORY_METRICS + ['per_core_usage', 'memory_used_gb', 'memory_available_gb']
+
+# Seconds between SSE comment lines that keep idle connections open
+LIVE_KEEPALIVE = 15
+
+
+class LiveSubscriber:
+    """One live stats client: its metric selection and a latest-only slot
+    
+    The broadcaster overwrites the slot instead of queueing, so a slow
+    client skips updates rather than holding back the sampler or others.
+    """
+
+    def __init__(self, metrics, interval):
+        self.metrics = metrics
+        self.interval = interval
+        self.last_sent = 0.0
+        self.dropped = 0
+        self._payload = None
+        self._ready = threading.Event()
+
+    def offer(self, payload):
+        if self._ready.is_set():
+            self.dropped += 1
+        self._payload = payload
+        self._ready.set()
+
+    def next(self, timeout):
+        """Wait for the newest payload; None if nothing arrived in time"""
+        if not self._ready.wait(timeout):
+            return None
+        self._ready.clear()
+        return self._payload
+
+
+class LiveBroadcaster:
+    """Fans each sampler update out to every live stats subscriber
+    
+    Values are computed once per sample and each distinct metric selection
+    is serialized once, so extra viewers cost a slot write each.
+    """
+
+    def __init__(self, max_subscribers=LIVE_MAX_SUBSCRIBERS):
+        self.subscribers = set()
+        self.max_subscribers = max_subscribers
+        self._previous = None
+        self._lock = threading.Lock()
+
+    def subscribe(self, metrics=None, interval=None):
+        """Register a subscriber; None if max_subscribers are already connected"""
+        subscriber = LiveSubscriber(tuple(metrics or LIVE_METRICS),
+                                    max(interval or sampler.interval, sampler.interval))
+        with self._lock:
+            if len(self.subscribers) >= self.max_subscribers:
+                return None
+            self.subscribers.add(subscriber)
+        sampler.add_listener(self.on_sample)
+        # Start from the latest sample instead of waiting a full interval
+        samples = sampler.samples
+        if samples:
+            previous = samples[-2] if len(samples) > 1 else None
+            self._publish(subscriber, self._values(samples[-1], previous), {})
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self.subscribers.discard(subscriber)
+
+    def _values(self, sample, previous):
+        values = sample_values(sample, previous)
+        values['timestamp'] = sample.timestamp
+        values['per_core_usage'] = sample.per_core_usage
+        values['memory_used_gb'] = round(sample.memory.used / (1024**3), 2)
+        values['memory_available_gb'] = round(sample.memory.available / (1024**3), 2)
+        return values
+
+    def _publish(self, subscriber, values, encoded):
+        payload = encoded.get(subscriber.metrics)
+        if payload is None:
+            update = {'timestamp': values['timestamp']}
+            update.update((name, values[name]) for name in subscriber.metrics)
+            payload = encoded[subscriber.metrics] = f'data: {json.dumps(update)}\n\n'.encode()
+        subscriber.last_sent = values['timestamp']
+        subscriber.offer(payload)
+
+    def on_sample(self, sample):
+        """Sampler listener: push the new sample to every due subscriber"""
+        previous, self._previous = self._previous, sample
+        with self._lock:
+            due = [s for s in self.subscribers
+                   # Half a sample of slack so sampler jitter doesn't skip a tick
+                   if sample.timestamp - s.last_sent >= s.interval - sampler.interval / 2]
+        if not due:
+            return
+        
+        values = self._values(sample, previous)
+        encoded = {}
+        for subscriber in due:
+            self._publish(subscriber, values, encoded)
+
+
+live_broadcaster = LiveBroadcaster()
+
+
+# ============================================================================
+# ANOMALY & LEAK DETECTION
+# ============================================================================
+
+class EwmaBaseline:
+    """Exponentially weighted mean and variance of one metric, in O(1) memory"""
+    __slots__ = ('alpha', 'floor', 'mean', 'var', 'count', 'active')
+
+    def __init__(self, span=ANOMALY_SPAN, floor=1.0):
+        self.alpha = 2.0 / (span + 1)
+        # Smallest standard deviation used, so a flat series doesn't make every blip infinite
+        self.floor = floor
+        self.mean = 0.0
+        self.var = 0.0
+        self.count = 0
+        self.active = False
+
+    @property
+    def std(self):
+        return max(self.var ** 0.5, self.floor)
+
+    def update(self, value):
+        """Fold in a value and return its z-score against the baseline before it"""
+        if self.count == 0:
+            self.mean = value
+            self.count = 1
+            return 0.0
+        z = (value - self.mean) / self.std
+        diff = value - self.mean
+        increment = self.alpha * diff
+        self.mean += increment
+        self.var = (1 - self.alpha) * (self.var + diff * increment)
+        self.count += 1
+        return z
+
+
+class GrowthTracker:
+    """Online least-squares slope of one process's RSS over time
+    
+    Keeps exponentially decayed sums instead of the samples, so memory is
+    constant and growth that stopped a while ago fades out.
+    """
+    __slots__ = ('name', 'started', 'last_t', 'rss_mb', 's0', 'st', 'sr', 'stt', 'str', 'srr', 'active')
+
+    def __init__(self, name, started):
+        self.name = name
+        self.started = started
+        self.last_t = 0.0
+        self.rss_mb = 0.0
+        self.s0 = self.st = self.sr = self.stt = self.str = self.srr = 0.0
+        self.active = False
+
+    def update(self, timestamp, rss_mb, window_hours=LEAK_MIN_HOURS * 2):
+        t = (timestamp - self.started) / 3600
+        decay = math.exp(-(t - self.last_t) / window_hours)
+        self.s0 = self.s0 * decay + 1
+        self.st = self.st * decay + t
+        self.sr = self.sr * decay + rss_mb
+        self.stt = self.stt * decay + t * t
+        self.str = self.str * decay + t * rss_mb
+        self.srr = self.srr * decay + rss_mb * rss_mb
+        self.last_t = t
+        self.rss_mb = rss_mb
+
+    def fit(self):
+        """(slope in MB/hour, r squared), or (0, 0) with too little spread"""
+        mean_t = self.st / self.s0
+        mean_r = self.sr / self.s0
+        var_t = self.stt / self.s0 - mean_t * mean_t
+        var_r = self.srr / self.s0 - mean_r * mean_r
+        if var_t <= 1e-9 or var_r <= 1e-9:
+            return 0.0, 0.0
+        cov = self.str / self.s0 - mean_t * mean_r
+        return cov / var_t, cov * cov / (var_t * var_r)
+
+
+class AnomalyDetector:
+    """Streaming detectors over the sampled metrics and the process table
+    
+    Every sample updates an EWMA baseline per metric and raises an alert
+    when a value is more than ANOMALY_Z standard deviations above it. Every
+    LEAK_CHECK_INTERVAL seconds each process's RSS is added to its growth
+    tracker, and steady growth for LEAK_MIN_HOURS raises a leak alert.
+    """
+
+    # Metrics judged for spikes, and the smallest std dev each is given
+    METRIC_FLOORS = {
+        'cpu_percent': 5.0, 'memory_percent': 2.0, 'swap_percent': 2.0,
+        'disk_read_mbps': 5.0, 'disk_write_mbps': 5.0,
+        'net_sent_mbps': 1.0, 'net_recv_mbps': 1.0,
+    }
+
+    def __init__(self, max_alerts=500):
+        self.baselines = {name: EwmaBaseline(floor=floor) for name, floor in self.METRIC_FLOORS.items()}
+        self.trackers = {}
+        self.alerts = deque(maxlen=max_alerts)
+        self._next_id = 1
+        self._previous = None
+        self._last_process_check = 0.0
+        self._checking = False
+        self._lock = threading.Lock()
+
+    def _alert(self, kind, series, message, **details):
+        with self._lock:
+            alert = {
+                'id': self._next_id,
+                'timestamp': time.time(),
+                'time': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                'kind': kind,
+                'series': series,
+                'message': message,
+                **details
+            }
+            self._next_id += 1
+            self.alerts.append(alert)
+        metrics.inc('pcdoctor_alerts_total', (('kind', kind),))
+
+    def on_sample(self, sample):
+        """Sampler listener: update the metric baselines, and the leak trackers when due"""
+        previous, self._previous = self._previous, sample
+        if previous is not None:
+            values = sample_values(sample, previous)
+            for name, baseline in self.baselines.items():
+                value = values[name]
+                if value is None:
+                    continue
+                z = baseline.update(value)
+                if baseline.count < 30:
+                    continue
+                if z >= ANOMALY_Z and not baseline.active:
+                    baseline.active = True
+                    self._alert('anomaly', name, f'{name} jumped to {value:.1f} (usual {baseline.mean:.1f})',
+                                severity='warning', value=round(value, 2),
+                                baseline=round(baseline.mean, 2), zscore=round(z, 1))
+                elif z < ANOMALY_Z / 2:
+                    baseline.active = False
+        
+        if not self._checking and sample.timestamp - self._last_process_check >= LEAK_CHECK_INTERVAL:
+            self._checking = True
+            self._last_process_check = sample.timestamp
+            collector_pool.submit(self.check_processes)
+
+    def check_processes(self):
+        """Feed every process's RSS into its growth tracker and report steady growth"""
+        try:
+            process_table.refresh()
+            now = time.time()
+            live = set()
+            for key, entry in process_table.items():
+                live.add(key)
+                tracker = self.trackers.get(key)
+                if tracker is None:
+                    tracker = self.trackers[key] = GrowthTracker(entry.name, now)
+                tracker.update(now, (entry.rss or 0) / (1024**2))
+                
+                slope, r2 = tracker.fit()
+                leaking = (tracker.last_t >= LEAK_MIN_HOURS and slope >= LEAK_MIN_MB_PER_HOUR and r2 >= 0.8)
+                if leaking and not tracker.active:
+                    self._alert('leak', f'{entry.name}:{entry.pid}',
+                                f'{entry.name} (PID {entry.pid}) memory grew {slope:.0f}MB/h '
+                                f'for {tracker.last_t:.1f}h, now {tracker.rss_mb:.0f}MB',
+                                severity='high', pid=entry.pid, name=entry.name,
+                                slope_mb_per_hour=round(slope, 1), rss_mb=round(tracker.rss_mb, 1))
+                tracker.active = leaking
+            
+            for key in self.trackers.keys() - live:
+                del self.trackers[key]
+        finally:
+            self._checking = False
+
+    def active_leaks(self):
+        """Processes currently showing steady memory growth"""
+        leaks = []
+        for (pid, _), tracker in list(self.trackers.items()):
+            if tracker.active:
+                slope, _ = tracker.fit()
+                leaks.append({'pid': pid, 'name': tracker.name, 'rss_mb': round(tracker.rss_mb, 1),
+                              'slope_mb_per_hour': round(slope, 1), 'tracked_hours': round(tracker.last_t, 1)})
+        return sorted(leaks, key=lambda leak: -leak['slope_mb_per_hour'])
+
+    def since(self, alert_id=0, limit=100):
+        with self._lock:
+            alerts = [alert for alert in self.alerts if alert['id'] > alert_id]
+        return alerts[-limit:]
+
+
+anomaly_detector = AnomalyDetector()
+
+
+# ============================================================================
+# AI MODEL CLIENT & ANALYSIS CACHE
+# ============================================================================
+
+class GeminiClient:
+    """Model client that sends prompts to Google Gemini
+
+    Any object with a name attribute and a generate(prompt) method
+    returning the response text can be passed to PCDiagnostic in its place.
+    """
+
+    _genai = None
+    _load_lock = threading.Lock()
+
+    def __init__(self, model_name=GEMINI_MODEL):
+        self.name = model_name
+
+    @property
+    def available(self):
+        return bool(GEMINI_API_KEY)
+
+    @classmethod
+    def load(cls):
+        """Import and configure the Gemini SDK, once
+        
+        The SDK pulls in a large dependency tree, so it is only imported
+        when an analysis needs it (or warmed in the background at startup).
+        """
+        with cls._load_lock:
+            if cls._genai is None:
+                with metrics.timer('import', 'google.generativeai'):
+                    import google.generativeai as genai
+                    genai.configure(api_key=GEMINI_API_KEY)
+                cls._genai = genai
+        return cls._genai
+
+    def generate(self, prompt):
+        model = self.load().GenerativeModel(self.name)
+        return model.generate_content(prompt).text
+
+
+def _bucket(value, step):
+    """Round a noisy numeric value to the nearest multiple of step"""
+    if value is None:
+        return None
+    return int(round(value / step) * step)
+
+
+def diagnostic_fingerprint(data):
+    """Hash diagnostic data with noisy values bucketed
+
+    Two scans of a machine that has barely changed (CPU within a few
+    percent, the same apps on top) produce the same fingerprint, so they
+    can share one AI analysis.
+    """
+    cpu = data.get('cpu', {})
+    memory = data.get('memory', {})
+    processes = data.get('processes', {})
+    top = processes.get('top_cpu_consumers', []) + processes.get('top_memory_consumers', [])
+    
+    fingerprint = {
+        'sections': sorted(data),
+        'system': data.get('system'),
+        'boot_time': data.get('boot', {}).get('boot_time'),
+        'cpu': [cpu.get('total_cores'), _bucket(cpu.get('current_usage_percent'), 10)],
+        'memory': [_bucket(memory.get(key), 1) for key in ('total_gb', 'used_gb', 'swap_used_gb')]
+                  + [_bucket(memory.get('usage_percent'), 10)],
+        'disk': sorted(
+            (p['mountpoint'], _bucket(p['total_gb'], 1), _bucket(p['free_gb'], 1), _bucket(p['usage_percent'], 10))
+            for p in data.get('disk', {}).get('partitions', [])
+        ),
+        'processes': sorted({p['name'] or '' for p in top}),
+    }
+    encoded = json.dumps(fingerprint, sort_keys=True, default=str).encode('utf-8')
+    return hashlib.sha1(encoded).hexdigest()
+
+
+def estimate_tokens(text):
+    """Rough token count for English/JSON text (about 4 characters per token)"""
+    return (len(text) + 3) // 4
+
+
+def _summarize_cores(per_core):
+    """Replace a per-core usage list with min/max/mean and the outlier cores"""
+    if not per_core:
+        return None
+    mean = sum(per_core) / len(per_core)
+    spread = (sum((u - mean) ** 2 for u in per_core) / len(per_core)) ** 0.5
+    return {
+        'min': round(min(per_core), 1),
+        'max': round(max(per_core), 1),
+        'mean': round(mean, 1),
+        # Cores far above the rest point at a single-threaded bottleneck
+        'outliers': {str(i): u for i, u in enumerate(per_core)
+                     if u >= 90 or (spread > 0 and u - mean > 2 * spread)}
+    }
+
+
+def _is_idle(rates):
+    return all(not value for value in rates.values())
+
+
+def compact_diagnostics(data, token_budget=PROMPT_TOKEN_BUDGET):
+    """Serialize diagnostic data compactly for the AI prompt
+    
+    Per-core usage is summarized, processes that appear in both top lists
+    are merged, idle disks/NICs, empty values and lifetime counters (which
+    the rates supersede) are dropped, and if the result is still over
+    token_budget the least important detail is trimmed step by step.
+    Returns (json_text, stats).
+    """
+    compact = copy.deepcopy(data)
+    
+    cpu = compact.get('cpu')
+    if cpu and 'per_core_usage' in cpu:
+        cpu['per_core_usage'] = _summarize_cores(cpu['per_core_usage'])
+    
+    processes = compact.get('processes')
+    if processes:
+        merged = OrderedDict()
+        for proc in processes.pop('top_cpu_consumers', []) + processes.pop('top_memory_consumers', []):
+            merged[proc['pid']] = proc
+        processes['top_processes'] = list(merged.values())
+        # Apps only need their totals; member PIDs and paths are for the UI
+        processes['top_apps'] = [
+            {key: app_info[key] for key in ('name', 'process_count', 'cpu_percent', 'memory_percent', 'rss_mb')}
+            for app_info in processes.get('top_apps', [])[:5]]
+    
+    disk = compact.get('disk')
+    if disk:
+        disk['io_rates'] = {name: r for name, r in disk.get('io_rates', {}).items() if not _is_idle(r)}
+        if disk['io_rates']:
+            disk.pop('io_counters', None)
+    
+    network = compact.get('network')
+    if network:
+        network['interfaces'] = {name: r for name, r in network.get('interfaces', {}).items() if not _is_idle(r)}
+        for key in ('bytes_sent_mb', 'bytes_received_mb', 'packets_sent', 'packets_received'):
+            network.pop(key, None)
+    
+    def prune(value):
+        if isinstance(value, dict):
+            pruned = {k: prune(v) for k, v in value.items()}
+            return {k: v for k, v in pruned.items() if v not in (None, '', [], {})}
+        if isinstance(value, list):
+            return [prune(v) for v in value]
+        return value
+    
+    compact = prune(compact)
+    
+    def trim_processes(limit):
+        def trim():
+            if 'processes' in compact:
+                compact['processes']['top_processes'] = compact['processes'].get('top_processes', [])[:limit]
+        return trim
+    
+    def trim_partitions(limit):
+        def trim():
+            partitions = compact.get('disk', {}).get('partitions')
+            if partitions:
+                # Keep the fullest partitions
+                compact['disk']['partitions'] = heapq.nlargest(
+                    limit, partitions, key=lambda p: p.get('usage_percent', 0))
+        return trim
+    
+    def drop(section, key):
+        def trim():
+            compact.get(section, {}).pop(key, None)
+        return trim
+    
+    # Least useful detail first
+    trims = [
+        ('processes:10', trim_processes(10)),
+        ('disk.partitions:10', trim_partitions(10)),
+        ('network.interfaces', drop('network', 'interfaces')),
+        ('processes.top_apps', drop('processes', 'top_apps')),
+        ('disk.largest_directories', drop('disk', 'largest_directories')),
+        ('processes:5', trim_processes(5)),
+        ('disk.io_rates', drop('disk', 'io_rates')),
+        ('cpu.per_core_usage', drop('cpu', 'per_core_usage')),
+        ('processes:3', trim_processes(3)),
+        ('disk.partitions:3', trim_partitions(3)),
+    ]
+    
+    text = json.dumps(compact, separators=(',', ':'))
+    trimmed = []
+    for name, trim in trims:
+        if estimate_tokens(text) <= token_budget:
+            break
+        trim()
+        trimmed.append(name)
+        text = json.dumps(compact, separators=(',', ':'))
+    
+    stats = {
+        'data_chars': len(text),
+        'data_tokens': estimate_tokens(text),
+        'token_budget': token_budget,
+        'uncompacted_tokens': estimate_tokens(json.dumps(data, indent=2)),
+        'trimmed': trimmed
+    }
+    return text, stats
+
+
+class AnalysisCache:
+    """LRU cache of AI analyses with a time-to-live"""
+
+    def __init__(self, maxsize=ANALYSIS_CACHE_SIZE, ttl=ANALYSIS_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return a cached analysis, or None if missing or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[0] < self.ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return copy.deepcopy(entry[1])
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, analysis):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), copy.deepcopy(analysis))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+model_client = GeminiClient()
+analysis_cache = AnalysisCache()
+
+# Pool for model calls, so a slow model can be abandoned without losing the
+# response (it still lands in the analysis cache for the next scan)
+llm_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix='llm')
+
+
+# ============================================================================
+# LOCAL HEALTH SCORING
+# ============================================================================
+
+# Rule thresholds; override any of them with a JSON object in
+# PCDOCTOR_HEALTH_THRESHOLDS, e.g. '{"memory_critical": 85}'
+HEALTH_THRESHOLDS = {
+    'cpu_warning': 70,
+    'cpu_critical': 90,
+    'memory_warning': 75,
+    'memory_critical': 90,
+    'swap_warning': 25,
+    'swap_critical': 60,
+    'disk_warning': 85,
+    'disk_critical': 95,
+    'disk_free_gb_critical': 5,
+    'process_cpu_warning': 50,
+    'process_memory_warning': 15,
+    'process_count_warning': 350,
+    'uptime_hours_warning': 168,
+    'warning_penalty': 10,
+    'critical_penalty': 25,
+}
+HEALTH_THRESHOLDS.update(json.loads(os.getenv('PCDOCTOR_HEALTH_THRESHOLDS', '{}')))
+
+
+def _finding(penalty, issue=None, bottleneck=None, recommendation=None):
+    return {'penalty': penalty, 'issue': issue, 'bottleneck': bottleneck, 'recommendation': recommendation}
+
+
+def _rule_cpu(data, t):
+    usage = data.get('cpu', {}).get('current_usage_percent')
+    if usage is None or usage < t['cpu_warning']:
+        return []
+    critical = usage >= t['cpu_critical']
+    top = data.get('processes', {}).get('top_cpu_consumers', [])[:3]
+    names = ', '.join(p['name'] for p in top if p.get('name')) or 'background processes'
+    return [_finding(
+        t['critical_penalty'] if critical else t['warning_penalty'],
+        issue={'title': 'Very high CPU usage' if critical else 'High CPU usage',
+               'description': f'CPU is at {usage:.0f}%, mostly from {names}.',
+               'severity': 'high' if critical else 'medium'},
+        bottleneck={'component': 'CPU', 'current_value': f'{usage:.0f}%',
+                    'description': 'Little CPU headroom left, so apps respond slowly.'},
+        recommendation={'title': 'Reduce CPU load',
+                        'description': f'The busiest processes are {names}.',
+                        'impact': 'High' if critical else 'Medium',
+                        'steps': ['Open Task Manager (Ctrl+Shift+Esc)',
+                                  f'Close or restart {names} if not needed',
+                                  'Disable unneeded startup apps']}
+    )]
+
+
+def _rule_memory(data, t):
+    memory = data.get('memory', {})
+    usage = memory.get('usage_percent')
+    findings = []
+    if usage is not None and usage >= t['memory_warning']:
+        critical = usage >= t['memory_critical']
+        processes = data.get('processes', {})
+        top = (processes.get('top_apps') or processes.get('top_memory_consumers', []))[:3]
+        names = ', '.join(p['name'] for p in top if p.get('name')) or 'open applications'
+        findings.append(_finding(
+            t['critical_penalty'] if critical else t['warning_penalty'],
+            issue={'title': 'RAM almost full' if critical else 'High memory usage',
+                   'description': f"{usage:.0f}% of {memory.get('total_gb', '?')}GB RAM in use.",
+                   'severity': 'high' if critical else 'medium'},
+            bottleneck={'component': 'RAM', 'current_value': f"{memory.get('used_gb', '?')}GB",
+                        'description': 'Low free memory forces Windows to page to disk.'},
+            recommendation={'title': 'Free up memory',
+                            'description': f'The largest memory users are {names}.',
+                            'impact': 'High' if critical else 'Medium',
+                            'steps': [f'Close {names} if not needed',
+                                      'Reduce open browser tabs',
+                                      'Consider adding more RAM if this is constant']}
+        ))
+    
+    swap = memory.get('swap_percent')
+    if memory.get('swap_total_gb') and swap is not None and swap >= t['swap_warning']:
+        critical = swap >= t['swap_critical']
+        findings.append(_finding(
+            t['critical_penalty'] if critical else t['warning_penalty'],
+            issue={'title': 'Heavy swap usage', 'description': f'{swap:.0f}% of the page file is in use.',
+                   'severity': 'high' if critical else 'low'},
+            bottleneck={'component': 'RAM', 'current_value': f"{memory.get('swap_used_gb', '?')}GB swap",
+                        'description': 'Paging to disk is far slower than RAM.'}
+        ))
+    return findings
+
+
+def _rule_disk(data, t):
+    findings = []
+    for partition in data.get('disk', {}).get('partitions', []):
+        usage = partition.get('usage_percent', 0)
+        free_gb = partition.get('free_gb', 0)
+        if usage < t['disk_warning']:
+            continue
+        # Few GB free is only critical on a drive that is also mostly full;
+        # small boot and recovery partitions never have much free space
+        critical = usage >= t['disk_critical'] or free_gb < t['disk_free_gb_critical']
+        mount = partition.get('mountpoint')
+        findings.append(_finding(
+            t['critical_penalty'] if critical else t['warning_penalty'],
+            issue={'title': f'Drive {mount} nearly full',
+                   'description': f'{usage:.0f}% used, {free_gb}GB free.',
+                   'severity': 'high' if critical else 'medium'},
+            bottleneck={'component': 'Disk', 'current_value': f'{free_gb}GB free',
+                        'description': 'Low free space slows updates, caching and paging.'},
+            recommendation={'title': f'Free up space on {mount}',
+                            'description': 'Temporary files, caches and the Recycle Bin are the quickest wins.',
+                            'impact': 'High' if critical else 'Medium',
+                            'steps': ['Run Clear Temp Files and Clear Browser Cache',
+                                      'Empty the Recycle Bin',
+                                      'Check the largest folders in Disk Usage']}
+        ))
+    return findings
+
+
+def _rule_processes(data, t):
+    processes = data.get('processes', {})
+    findings = []
+    for proc in processes.get('top_memory_consumers', [])[:3]:
+        if (proc.get('memory_percent') or 0) >= t['process_memory_warning']:
+            findings.append(_finding(
+                t['warning_penalty'],
+                bottleneck={'component': 'RAM', 'current_value': f"{proc['memory_percent']:.0f}%",
+                            'description': f"{proc['name']} (PID {proc['pid']}) alone uses a large share of RAM."}
+            ))
+    for proc in processes.get('top_cpu_consumers', [])[:3]:
+        if (proc.get('cpu_percent') or 0) >= t['process_cpu_warning']:
+            findings.append(_finding(
+                t['warning_penalty'],
+                bottleneck={'component': 'CPU', 'current_value': f"{proc['cpu_percent']:.0f}%",
+                            'description': f"{proc['name']} (PID {proc['pid']}) is keeping a core busy."}
+            ))
+    count = processes.get('total_running', 0)
+    if count >= t['process_count_warning']:
+        findings.append(_finding(
+            t['warning_penalty'],
+            recommendation={'title': 'Trim background processes',
+                            'description': f'{count} processes are running.',
+                            'impact': 'Medium',
+                            'steps': ['Open Task Manager > Startup', 'Disable apps you do not need at boot',
+                                      'Uninstall unused software']}
+        ))
+    return findings
+
+
+def _rule_uptime(data, t):
+    uptime = data.get('boot', {}).get('uptime_hours', 0)
+    if uptime < t['uptime_hours_warning']:
+        return []
+    return [_finding(
+        t['warning_penalty'] // 2,
+        recommendation={'title': 'Restart your PC',
+                        'description': f'It has been running for {uptime / 24:.0f} days.',
+                        'impact': 'Low',
+                        'steps': ['Save your work', 'Restart to clear leaked memory and apply updates']}
+    )]
+
+
+def _rule_leaks(data, t):
+    return [_finding(
+        t['warning_penalty'],
+        issue={'title': f"Possible memory leak in {leak['name']}",
+               'description': f"Memory has grown {leak['slope_mb_per_hour']:.0f}MB/h for "
+                              f"{leak['tracked_hours']:.1f}h (now {leak['rss_mb']:.0f}MB).",
+               'severity': 'medium'},
+        recommendation={'title': f"Restart {leak['name']}",
+                        'description': 'Restarting it returns the leaked memory.',
+                        'impact': 'Medium',
+                        'steps': [f"Save your work in {leak['name']}", 'Close and reopen it',
+                                  'Check for an update if it keeps happening']}
+    ) for leak in data.get('processes', {}).get('suspected_leaks', [])[:3]]
+
+
+HEALTH_RULES = [_rule_cpu, _rule_memory, _rule_disk, _rule_processes, _rule_uptime, _rule_leaks]
+
+
+def _health_status(score):
+    if score >= 90:
+        return 'Excellent'
+    if score >= 70:
+        return 'Good'
+    if score >= 50:
+        return 'Fair'
+    return 'Poor'
+
+
+def _level_status(value, warning, critical, labels):
+    if value is None:
+        return 'Unknown - not collected'
+    if value >= critical:
+        return f'{labels[2]} - {value:.0f}%'
+    if value >= warning:
+        return f'{labels[1]} - {value:.0f}%'
+    return f'{labels[0]} - {value:.0f}%'
+
+
+def score_locally(data, thresholds=None):
+    """Rule-based health analysis in the same JSON schema as the AI analysis"""
+    t = dict(HEALTH_THRESHOLDS, **(thresholds or {}))
+    findings = [finding for rule in HEALTH_RULES for finding in rule(data, t)]
+    score = max(0, 100 - sum(f['penalty'] for f in findings))
+    
+    impact_order = {'High': 0, 'Medium': 1, 'Low': 2}
+    recommendations = sorted((f['recommendation'] for f in findings if f['recommendation']),
+                             key=lambda r: impact_order.get(r['impact'], 3))[:5]
+    
+    disk_usage = max((p.get('usage_percent', 0) for p in data.get('disk', {}).get('partitions', [])), default=None)
+    issues = [f['issue'] for f in findings if f['issue']]
+    
+    return {
+        'health_score': score,
+        'health_status': _health_status(score),
+        'critical_issues': [i for i in issues if i['severity'] == 'high'],
+        'performance_bottlenecks': [f['bottleneck'] for f in findings if f['bottleneck']],
+        'recommendations': recommendations,
+        'quick_insights': {
+            'cpu_status': _level_status(data.get('cpu', {}).get('current_usage_percent'),
+                                        t['cpu_warning'], t['cpu_critical'], ('Healthy', 'Busy', 'Overloaded')),
+            'memory_status': _level_status(data.get('memory', {}).get('usage_percent'),
+                                           t['memory_warning'], t['memory_critical'], ('Healthy', 'Moderate', 'Critical')),
+            'disk_status': _level_status(disk_usage, t['disk_warning'], t['disk_critical'],
+                                         ('Good', 'Getting full', 'Nearly full')),
+            'overall_summary': (f'{len(issues)} issue(s) found by local checks.' if issues
+                                else 'No problems found by local checks.')
+        }
+    }
+
+
+@functools.lru_cache(maxsize=None)
+def system_facts():
+    """Facts that cannot change while the process runs, looked up once
+    
+    platform.processor() can shell out and boot time is derived from the
+    uptime counter, so neither is worth repeating on every scan.
+    """
+    cpu_freq = psutil.cpu_freq()
+    return {
+        'os': platform.system(),
+        'os_version': platform.version(),
+        'processor': platform.processor(),
+        'architecture': platform.machine(),
+        'physical_cores': psutil.cpu_count(logical=False),
+        'total_cores': psutil.cpu_count(logical=True),
+        'max_frequency_mhz': cpu_freq.max if cpu_freq else 0,
+        'boot_timestamp': psutil.boot_time()
+    }
+
+
+def wait_until_listening(host, port, timeout=30):
+    """Block until a TCP connect to host:port succeeds; False on timeout"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection((host, port), timeout=0.5):
+                return True
+        except OSError:
+            time.sleep(0.05)
+    return False
+
+
+def start_background_services():
+    """Start the long-running helpers that the endpoints read from"""
+    # First disk readings, so the sampler's disk figure is ready almost at once
+    collector_pool.submit(partition_monitor.collect)
+    sampler.start()
+    collector_pool.submit(system_facts)
+    if isinstance(model_client, GeminiClient) and model_client.available:
+        # Warm the AI SDK off the startup path so the first scan doesn't pay for it
+        llm_pool.submit(GeminiClient.load)
+    # Prime the process table so the first scan already has CPU deltas
+    collector_pool.submit(process_table.refresh, True)
+    collector_pool.submit(disk_index.load)
+    sampler.add_listener(history_store.on_sample)
+    sampler.add_listener(live_broadcaster.on_sample)
+    sampler.add_listener(anomaly_detector.on_sample)
+
+
+class PCDiagnostic:
+    # Diagnostic section -> collector method, in the order sections are reported
+    COLLECTORS = [
+        ('system', 'collect_system_info'),
+        ('cpu', 'collect_cpu_info'),
+        ('memory', 'collect_memory_info'),
+        ('disk', 'collect_disk_info'),
+        ('processes', 'collect_process_info'),
+        ('network', 'collect_network_info'),
+        ('boot', 'collect_boot_info'),
+    ]
+    
+    # Per-collector overrides of COLLECTOR_TIMEOUT (seconds)
+    COLLECTOR_TIMEOUTS = {
+        'processes': 10.0,
+    }
+    
+    def __init__(self, timeouts=None, model=None, cache=None, extras=True):
+        self.data = {}
+        # Dashboard-only sections (directory index, app grouping); fleet agents skip them
+        self.extras = extras
+        self.collection_status = {}
+        self.timeouts = dict(self.COLLECTOR_TIMEOUTS, **(timeouts or {}))
+        self.model = model or model_client
+        self.cache = analysis_cache if cache is None else cache
+        self.analysis_cached = False
+        self.analysis_source = None
+        self.ai_error = None
+        self.prompt_stats = None
+        
+    def collect_system_info(self):
+        """Collect basic system information"""
+        facts = system_facts()
+        self.data['system'] = {
+            'os': facts['os'],
+            'os_version': facts['os_version'],
+            'processor': facts['processor'],
+            'architecture': facts['architecture'],
+            'hostname': platform.node()
+        }
+        
+    def collect_cpu_info(self):
+        """Collect CPU usage and information"""
+        sample = sampler.latest()
+        facts = system_facts()
+        cpu_freq = psutil.cpu_freq()
+        
+        self.data['cpu'] = {
+            'physical_cores': facts['physical_cores'],
+            'total_cores': facts['total_cores'],
+            'current_usage_percent': sample.cpu_percent,
+            'current_frequency_mhz': cpu_freq.current if cpu_freq else 0,
+            'max_frequency_mhz': facts['max_frequency_mhz'],
+            'per_core_usage': sample.per_core_usage
+        }
+        
+    def collect_memory_info(self):
+        """Collect RAM information"""
+        sample = sampler.latest()
+        memory = sample.memory
+        swap = sample.swap
+        
+        self.data['memory'] = {
+            'total_gb': round(memory.total / (1024**3), 2),
+            'available_gb': round(memory.available / (1024**3), 2),
+            'used_gb': round(memory.used / (1024**3), 2),
+            'usage_percent': memory.percent,
+            'swap_total_gb': round(swap.total / (1024**3), 2),
+            'swap_used_gb': round(swap.used / (1024**3), 2),
+            'swap_percent': swap.percent
+        }
+        
+    def collect_disk_info(self):
+        """Collect disk information"""
+        # Bounded by the per-mount timeout; slow mounts are served stale or listed as unavailable
+        disk_info, unavailable = partition_monitor.collect()
+        
+        disk_io = sampler.latest().disk_io
+        
+        self.data['disk'] = {
+            'partitions': disk_info,
+            'unavailable_partitions': unavailable,
+            'io_rates': sampler.rates()['disks'],
+            'io_counters': {
+                'read_mb': round(disk_io.read_bytes / (1024**2), 2),
+                'write_mb': round(disk_io.write_bytes / (1024**2), 2),
+                'read_count': disk_io.read_count,
+                'write_count': disk_io.write_count
+            } if disk_io else {}
+        }
+        if self.extras:
+            # Keep the space index current without making the scan wait for it
+            disk_index.refresh_in_background()
+            self.data['disk']['largest_directories'] = disk_index.top(5)['largest_directories']
+        
+    def collect_process_info(self):
+        """Collect top resource-consuming processes"""
+        process_table.refresh()
+        
+        # Select top 10 by CPU and memory usage with a heap, not a full sort
+        top_cpu = process_table.top(10, key='cpu_percent')
+        top_memory = process_table.top(10, key='memory_percent')
+        
+        self.data['processes'] = {
+            'total_running': len(process_table),
+            'top_cpu_consumers': [entry.to_dict() for entry in top_cpu],
+            'top_memory_consumers': [entry.to_dict() for entry in top_memory],
+            'suspected_leaks': anomaly_detector.active_leaks()[:5]
+        }
+        if self.extras:
+            self.data['processes']['top_apps'] = [app_to_dict(app_info, max_pids=5) for app_info in top_apps(10)]
+        
+    def collect_network_info(self):
+        """Collect network information"""
+        net_io = sampler.latest().net_io
+        
+        self.data['network'] = {
+            'bytes_sent_mb': round(net_io.bytes_sent / (1024**2), 2),
+            'bytes_received_mb': round(net_io.bytes_recv / (1024**2), 2),
+            'packets_sent': net_io.packets_sent,
+            'packets_received': net_io.packets_recv,
+            'interfaces': sampler.rates()['interfaces']
+        }
+        
+    def collect_boot_info(self):
+        """Collect boot time information"""
+        boot_timestamp = system_facts()['boot_timestamp']
+        boot_time = datetime.fromtimestamp(boot_timestamp)
+        uptime_seconds = time.time() - boot_timestamp
+        
+        self.data['boot'] = {
+            'boot_time': boot_time.strftime("%Y-%m-%d %H:%M:%S"),
+            'uptime_hours': round(uptime_seconds / 3600, 2)
+        }
+        
+    def _run_collector(self, section, method_name):
+        """Run one collector against a private copy of the data dict"""
+        # A collector that finishes after its timeout must not modify
+        # results that have already been returned, so each one fills its
+        # own dict and only the completed ones are merged into self.data
+        worker = copy.copy(self)
+        worker.data = {}
+        with metrics.timer('collector', section):
+            getattr(worker, method_name)()
+        return worker.data
+    
+    def iter_diagnostics(self):
+        """Run all collectors concurrently, yielding each section as it finishes
+        
+        Yields (section, status) tuples in completion order. Collectors that
+        raise or exceed their timeout are reported with a status of 'error'
+        or 'timeout' and their section is left out of self.data.
+        """
+        started = time.perf_counter()
+        pending = {}
+        for section, method_name in self.COLLECTORS:
+            future = collector_pool.submit(self._run_collector, section, method_name)
+            deadline = started + self.timeouts.get(section, COLLECTOR_TIMEOUT)
+            pending[future] = (section, deadline)
+        
+        while pending:
+            next_deadline = min(deadline for _, deadline in pending.values())
+            done, _ = wait(pending, timeout=max(0, next_deadline - time.perf_counter()),
+                           return_when=FIRST_COMPLETED)
+            now = time.perf_counter()
+            
+            for future in done:
+                section, _ = pending.pop(future)
+                status = {'duration_ms': round((now - started) * 1000, 1)}
+                try:
+                    self.data.update(future.result())
+                    status['status'] = 'ok'
+                except Exception as e:
+                    status['status'] = 'error'
+                    status['error'] = str(e)
+                self.collection_status[section] = status
+                add_server_timing(f'collect-{section}', now - started)
+                yield section, status
+            
+            for future, (section, deadline) in list(pending.items()):
+                if now >= deadline:
+                    del pending[future]
+                    future.cancel()
+                    status = {
+                        'status': 'timeout',
+                        'duration_ms': round((now - started) * 1000, 1),
+                        'error': f'Timed out after {self.timeouts.get(section, COLLECTOR_TIMEOUT)}s'
+                    }
+                    self.collection_status[section] = status
+                    metrics.inc('pcdoctor_collector_errors_total', (('name', section), ('reason', 'timeout')))
+                    add_server_timing(f'collect-{section}', now - started)
+                    yield section, status
+    
+    def order_sections(self):
+        """Put sections back in their usual order regardless of completion order"""
+        order = [section for section, _ in self.COLLECTORS]
+        self.data = {section: self.data[section] for section in order if section in self.data}
+        return self.data
+    
+    def collect_all_diagnostics(self):
+        """Run all diagnostic collections"""
+        for _ in self.iter_diagnostics():
+            pass
+        
+        return self.order_sections()
+    
+    def analyze_locally(self):
+        """Rule-based analysis of the collected data, with no model call"""
+        with metrics.timer('analysis', 'local'):
+            return score_locally(self.data)
+    
+    def analyze(self, use_cache=True, use_ai=True, timeout=LLM_TIMEOUT, local=None):
+        """AI analysis if the model answers within timeout, else the local one
+        
+        Sets analysis_source to 'ai' or 'local' and ai_error to the reason
+        the model was not used, if any.
+        """
+        local = local or self.analyze_locally()
+        if not use_ai:
+            self.analysis_source = 'local'
+            return local
+        if not getattr(self.model, 'available', True):
+            self.analysis_source = 'local'
+            self.ai_error = 'AI model not configured (set GEMINI_API_KEY)'
+            return local
+        
+        future = llm_pool.submit(self.analyze_with_gemini, use_cache)
+        started = time.perf_counter()
+        try:
+            analysis = future.result(timeout=timeout)
+            self.analysis_source = 'ai'
+            return analysis
+        except TimeoutError:
+            self.ai_error = f'AI analysis timed out after {timeout:g}s'
+        except Exception as e:
+            self.ai_error = f'AI analysis failed: {str(e)}'
+        finally:
+            # The model call runs on llm_pool, outside the request context,
+            # so its share of Server-Timing is recorded here
+            add_server_timing('llm', time.perf_counter() - started)
+        metrics.inc('pcdoctor_analysis_fallbacks_total')
+        self.analysis_source = 'local'
+        return local
+    
+    def analyze_with_gemini(self, use_cache=True):
+        """Send diagnostic data to Gemini for structured analysis"""
+        cache_key = f"{self.model.name}:{diagnostic_fingerprint(self.data)}"
+        if use_cache:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                self.analysis_cached = True
+                metrics.inc('pcdoctor_llm_cache_hits_total')
+                return cached
+        self.analysis_cached = False
+        
+        diagnostic_json, self.prompt_stats = compact_diagnostics(self.data)
+        prompt = f"""You are a PC performance expert. Analyze this system diagnostic data and provide a structured response.
+
+System Diagnostic Data (compact JSON; per_core_usage is summarized):
+{diagnostic_json}
+
+Respond with a JSON object in this EXACT format (no markdown, no extra text):
+{{
+  "health_score": 85,
+  "health_status": "Good",
+  "critical_issues": [
+    {{"title": "Issue title", "description": "Brief description", "severity": "high/medium/low"}}
+  ],
+  "performance_bottlenecks": [
+    {{"component": "RAM/CPU/Disk", "current_value": "10GB", "description": "Why this is a bottleneck"}}
+  ],
+  "recommendations": [
+    {{
+      "title": "Recommendation title",
+      "description": "Detailed explanation",
+      "impact": "High/Medium/Low",
+      "steps": ["Step 1", "Step 2", "Step 3"]
     }}
   ],
   "quick_insights": {{
@@ -186,134 +2327,1517 @@ Respond with a JSON object in this EXACT format (no markdown, no extra text):
   }}
 }}
 
-Important:
-- health_score: 0-100 (100 = perfect)
-- health_status: "Excellent" (90-100), "Good" (70-89), "Fair" (50-69), "Poor" (0-49)
-- critical_issues: Only serious problems causing significant slowdown
-- Limit recommendations to top 5 most impactful
-- Make descriptions concise and actionable
-- RETURN ONLY VALID JSON, NO MARKDOWN FORMATTING"""
+Important:
+- health_score: 0-100 (100 = perfect)
+- health_status: "Excellent" (90-100), "Good" (70-89), "Fair" (50-69), "Poor" (0-49)
+- critical_issues: Only serious problems causing significant slowdown
+- Limit recommendations to top 5 most impactful
+- Make descriptions concise and actionable
+- RETURN ONLY VALID JSON, NO MARKDOWN FORMATTING"""
+        self.prompt_stats['prompt_chars'] = len(prompt)
+        self.prompt_stats['prompt_tokens'] = estimate_tokens(prompt)
+
+        with metrics.timer('llm', self.model.name):
+            response_text = self.model.generate(prompt).strip()
+        
+        # Remove markdown code blocks if present
+        if response_text.startswith('```'):
+            response_text = response_text.split('```')[1]
+            if response_text.startswith('json'):
+                response_text = response_text[4:]
+            response_text = response_text.strip()
+        
+        analysis = json.loads(response_text)
+        self.cache.put(cache_key, analysis)
+        return analysis
+
+
+# ============================================================================
+# SCAN COALESCING
+# ============================================================================
+
+class SingleFlight:
+    """Runs at most one call per key at a time
+    
+    Callers arriving while a call is in flight wait for it and share its
+    result, and a result younger than `max_age` is handed out directly.
+    Failures are passed to every waiting caller but never reused.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._results = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, func, max_age=0):
+        """Return (result, shared) where shared is True if func ran for another caller"""
+        with self._lock:
+            done = self._results.get(key)
+            if done is not None and time.monotonic() - done[0] <= max_age:
+                return done[1], True
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = Future()
+        
+        if not leader:
+            return call.result(), True
+        
+        try:
+            result = func()
+        except BaseException as e:
+            with self._lock:
+                del self._calls[key]
+            call.set_exception(e)
+            raise
+        with self._lock:
+            self._results[key] = (time.monotonic(), result)
+            del self._calls[key]
+        call.set_result(result)
+        return result, False
+
+
+scan_flight = SingleFlight()
+
+
+class ScanProgress:
+    """Events of one streamed scan, replayed to every client that joins it"""
+
+    def __init__(self):
+        self.events = []
+        self.done = False
+        self._cond = threading.Condition()
+
+    def publish(self, event, done=False):
+        with self._cond:
+            self.events.append(json.dumps(event) + '\n')
+            self.done = self.done or done
+            self._cond.notify_all()
+
+    def follow(self):
+        """Yield every event from the start, waiting for new ones until the scan is done"""
+        index = 0
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: index < len(self.events) or self.done)
+                events = self.events[index:]
+                done = self.done
+            index += len(events)
+            yield from events
+            if done and index == len(self.events):
+                return
+
+
+# In-flight streamed scans by (use_cache, use_ai)
+stream_scans = {}
+stream_scans_lock = threading.Lock()
+
+
+def run_scan(use_cache, use_ai, progress=None):
+    """Collect diagnostics and analyze them, publishing events to progress as they happen"""
+    diagnostic = PCDiagnostic()
+    
+    # Collect all diagnostic data
+    for section, status in diagnostic.iter_diagnostics():
+        if progress:
+            progress.publish({
+                'event': 'section',
+                'section': section,
+                'data': diagnostic.data.get(section),
+                'status': status
+            })
+    diagnostic_data = diagnostic.order_sections()
+    
+    local = diagnostic.analyze_locally()
+    if progress:
+        progress.publish({
+            'event': 'diagnostics_complete',
+            'diagnostic_data': diagnostic_data,
+            'collection_status': diagnostic.collection_status
+        })
+        progress.publish({
+            'event': 'local_analysis',
+            'ai_analysis': local
+        })
+    
+    # Get AI analysis, falling back to local rules if the model is
+    # unavailable or slow (?ai=0 skips the model, ?refresh=1 the cache)
+    ai_analysis = diagnostic.analyze(use_cache=use_cache, use_ai=use_ai, local=local)
+    
+    # Combine results
+    return {
+        'success': True,
+        'diagnostic_data': diagnostic_data,
+        'collection_status': diagnostic.collection_status,
+        'ai_analysis': ai_analysis,
+        'analysis_source': diagnostic.analysis_source,
+        'ai_error': diagnostic.ai_error,
+        'ai_analysis_cached': diagnostic.analysis_cached,
+        'prompt_stats': diagnostic.prompt_stats,
+        'scan_time': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    }
+
+
+def _stream_scan(key, progress):
+    """Run (or join) a scan for a streaming client, in the background
+    
+    Goes through scan_flight, so a stream shares an in-flight or fresh
+    /api/scan result and vice versa. A shared result is replayed as events.
+    """
+    use_cache, use_ai = key
+    leader = [False]
+    
+    def scan():
+        leader[0] = True
+        return run_scan(use_cache, use_ai, progress)
+    
+    try:
+        result, _ = scan_flight.do(key, scan, max_age=SCAN_FRESHNESS if use_cache else 0)
+        if not leader[0]:
+            for section, data in result['diagnostic_data'].items():
+                progress.publish({
+                    'event': 'section',
+                    'section': section,
+                    'data': data,
+                    'status': result['collection_status'].get(section)
+                })
+            progress.publish({
+                'event': 'diagnostics_complete',
+                'diagnostic_data': result['diagnostic_data'],
+                'collection_status': result['collection_status']
+            })
+        progress.publish({
+            'event': 'analysis',
+            **{k: v for k, v in result.items() if k not in ('diagnostic_data', 'collection_status')}
+        }, done=True)
+    except Exception as e:
+        progress.publish({
+            'event': 'error',
+            'success': False,
+            'error': str(e)
+        }, done=True)
+    finally:
+        with stream_scans_lock:
+            if stream_scans.get(key) is progress:
+                del stream_scans[key]
+
+
+@app.route('/')
+def index():
+    """Serve the dashboard"""
+    return render_template('index.html')
+
+@app.route('/api/scan', methods=['POST'])
+def scan_system():
+    """Run system diagnostic and return results
+    
+    Concurrent scans with the same options share one run, and a result
+    less than SCAN_FRESHNESS seconds old is reused (except with ?refresh=1).
+    """
+    use_cache = request.args.get('refresh') != '1'
+    use_ai = request.args.get('ai') != '0'
+    
+    try:
+        result, shared = scan_flight.do((use_cache, use_ai), functools.partial(run_scan, use_cache, use_ai),
+                                        max_age=SCAN_FRESHNESS if use_cache else 0)
+        if shared:
+            metrics.inc('pcdoctor_scans_coalesced_total')
+        
+        return jsonify({**result, 'coalesced': shared})
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/scan/stream', methods=['POST'])
+def scan_system_stream():
+    """Run system diagnostic, streaming results as newline-delimited JSON
+    
+    Each collector's section is sent as soon as it is ready, followed by a
+    'diagnostics_complete' event, an instant 'local_analysis' from the rule
+    engine and finally the AI analysis (or the local one as a fallback).
+    Concurrent streams share one scan, and so do /api/scan callers.
+    """
+    use_cache = request.args.get('refresh') != '1'
+    use_ai = request.args.get('ai') != '0'
+    key = (use_cache, use_ai)
+    
+    # Clients arriving mid-scan join it and get every event from the start;
+    # the scan runs in the background so it survives the first client leaving
+    with stream_scans_lock:
+        progress = stream_scans.get(key)
+        joined = progress is not None
+        if not joined:
+            progress = stream_scans[key] = ScanProgress()
+    if joined:
+        metrics.inc('pcdoctor_scans_coalesced_total')
+    else:
+        threading.Thread(target=_stream_scan, args=(key, progress), name='scan-stream', daemon=True).start()
+    
+    response = Response(progress.follow(), mimetype='application/x-ndjson')
+    # Stop reverse proxies from buffering the stream
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@app.route('/api/quick-stats', methods=['GET'])
+def quick_stats():
+    """Get quick system stats without full analysis"""
+    try:
+        sample = sampler.latest()
+        
+        return jsonify({
+            'success': True,
+            'stats': {
+                'cpu_percent': sample.cpu_percent,
+                'memory_percent': sample.memory.percent,
+                'disk_percent': sample.disk_usage.percent if sample.disk_usage else None,
+                'disk_mount': SYSTEM_MOUNT
+            }
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+@app.route('/api/system-info', methods=['GET'])
+def system_info():
+    """Static system facts, looked up once at startup"""
+    facts = system_facts()
+    return jsonify({
+        'success': True,
+        'system': {**facts, 'hostname': platform.node()},
+        'boot_time': datetime.fromtimestamp(facts['boot_timestamp']).strftime("%Y-%m-%d %H:%M:%S")
+    })
+
+
+@app.route('/api/live', methods=['GET'])
+def live_stats():
+    """Server-Sent Events stream of live stats (?metrics=cpu_percent,memory_percent&interval=2)"""
+    selected = [m for m in request.args.get('metrics', '').split(',') if m]
+    unknown = [m for m in selected if m not in LIVE_METRICS]
+    if unknown:
+        return jsonify({
+            'success': False,
+            'error': f"Unknown metric: {', '.join(unknown)}",
+            'metrics': LIVE_METRICS
+        }), 400
+    
+    interval = None
+    if 'interval' in request.args:
+        try:
+            interval = float(request.args['interval'])
+        except ValueError:
+            interval = math.nan
+        if not math.isfinite(interval) or interval <= 0:
+            return jsonify({
+                'success': False,
+                'error': 'Invalid interval - use a positive number of seconds'
+            }), 400
+    
+    sampler.latest()
+    subscriber = live_broadcaster.subscribe(selected, interval)
+    if subscriber is None:
+        return jsonify({
+            'success': False,
+            'error': 'Too many live stats viewers - try again later'
+        }), 503
+    
+    def generate():
+        try:
+            yield f'retry: {int(subscriber.interval * 1000)}\n\n'.encode()
+            while True:
+                payload = subscriber.next(timeout=LIVE_KEEPALIVE)
+                yield payload if payload is not None else b': keepalive\n\n'
+        finally:
+            live_broadcaster.unsubscribe(subscriber)
+    
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+
+@app.route('/api/apps', methods=['GET'])
+def list_apps():
+    """Processes grouped into apps (?sort=memory|cpu|io&top=20&uss=1)"""
+    try:
+        top = min(request.args.get('top', 20, type=int), 200)
+        apps = top_apps(top, request.args.get('sort', 'memory'))
+        result = [app_to_dict(app_info) for app_info in apps]
+        
+        if request.args.get('uss') == '1':
+            # Unique set size needs a full memory map per process, so only the listed apps pay for it
+            for app_info, entry in zip(apps, result):
+                pids = [member.pid for member in app_info['members']]
+                entry['uss_mb'] = round(sum(collector_pool.map(_uss, pids)) / (1024**2), 1)
+        
+        return jsonify({
+            'success': True,
+            'total_processes': len(process_table),
+            'apps': result
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+@app.route('/api/alerts', methods=['GET'])
+def alerts():
+    """Anomaly and leak alerts newer than ?since=<id>, plus current leaks and baselines"""
+    since = request.args.get('since', 0, type=int)
+    limit = min(request.args.get('limit', 100, type=int), 500)
+    recent = anomaly_detector.since(since, limit)
+    return jsonify({
+        'success': True,
+        'alerts': recent,
+        'last_id': recent[-1]['id'] if recent else since,
+        'active_leaks': anomaly_detector.active_leaks(),
+        'baselines': {name: {'mean': round(b.mean, 2), 'std': round(b.std, 2), 'samples': b.count}
+                      for name, b in anomaly_detector.baselines.items()}
+    })
+
+
+@app.route('/api/disk-usage', methods=['GET'])
+def disk_usage():
+    """Largest directories and files from the disk usage index"""
+    try:
+        disk_index.load()
+        job = disk_index.refresh_in_background()
+        top = min(request.args.get('top', 20, type=int), DiskUsageIndex.RANKING_SIZE)
+        
+        return jsonify({
+            'success': True,
+            'indexing': job is not None and job.finished_at is None,
+            'job_id': job.id if job else None,
+            **disk_index.top(top)
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/disk-usage/refresh', methods=['POST'])
+def refresh_disk_usage():
+    """Refresh the disk usage index now (?full=1 re-lists every directory)"""
+    job = disk_index.refresh_in_background(min_interval=0, full=request.args.get('full') == '1')
+    return jsonify({
+        'success': True,
+        'job_id': job.id,
+        'job': job.to_dict()
+    }), 202
+
+
+@app.route('/api/history', methods=['GET'])
+def metric_history():
+    """Recorded history of one metric (?metric=cpu_percent&range=1h)"""
+    metric = request.args.get('metric', 'cpu_percent')
+    if metric not in HISTORY_METRICS:
+        return jsonify({
+            'success': False,
+            'error': f'Unknown metric: {metric}',
+            'metrics': HISTORY_METRICS
+        }), 400
+    try:
+        seconds = parse_duration(request.args.get('range', '1h'))
+    except ValueError:
+        return jsonify({
+            'success': False,
+            'error': 'Invalid range - use e.g. 15m, 6h or 7d'
+        }), 400
+    
+    try:
+        points = max(1, min(request.args.get('points', 500, type=int), 5000))
+        return jsonify({
+            'success': True,
+            **history_store.query(metric, seconds, max_points=points)
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Expose timings and counters in the Prometheus text format"""
+    gauges = {
+        'pcdoctor_analysis_cache_entries': len(analysis_cache),
+        'pcdoctor_processes_tracked': len(process_table),
+        'pcdoctor_sampler_samples': len(sampler.samples),
+        'pcdoctor_live_subscribers': len(live_broadcaster.subscribers),
+    }
+    for phase, seconds in startup_profile.phases:
+        gauges[f'pcdoctor_startup_{phase}_seconds'] = seconds
+    return Response(metrics.render(gauges), mimetype='text/plain; version=0.0.4')
+
+
+# ============================================================================
+# OPTIMIZATION TASKS & JOBS
+# ============================================================================
+
+class Job:
+    """A background optimization run with progress, cancellation and result"""
+
+    def __init__(self, kind):
+        self.id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.status = 'pending'
+        self.bytes_processed = 0
+        self.files_processed = 0
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._cancel = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def cancel(self):
+        self._cancel.set()
+
+    def add_progress(self, bytes_processed=0, files_processed=0):
+        with self._lock:
+            self.bytes_processed += bytes_processed
+            self.files_processed += files_processed
+
+    def to_dict(self):
+        return {
+            'job_id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'progress': {
+                'bytes_processed': self.bytes_processed,
+                'mb_processed': round(self.bytes_processed / (1024 * 1024), 2),
+                'files_processed': self.files_processed
+            },
+            'result': self.result,
+            'error': self.error,
+            'created_at': datetime.fromtimestamp(self.created_at).strftime("%Y-%m-%d %H:%M:%S"),
+            'duration_s': round((self.finished_at or time.time()) - self.started_at, 2) if self.started_at else None
+        }
+
+
+class JobManager:
+    """Run optimization tasks on a worker pool and keep their status"""
+
+    def __init__(self, max_workers=4, keep=100):
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job')
+        self.keep = keep
+        self.jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, kind, task):
+        """Start task(job) in the background and return its Job right away"""
+        job = Job(kind)
+        with self._lock:
+            self.jobs[job.id] = job
+            # Forget the oldest finished jobs once over the limit
+            for job_id in list(self.jobs):
+                if len(self.jobs) <= self.keep:
+                    break
+                if self.jobs[job_id].finished_at:
+                    del self.jobs[job_id]
+        self.pool.submit(self._run, job, task)
+        return job
+
+    def _run(self, job, task):
+        job.status = 'running'
+        job.started_at = time.time()
+        try:
+            job.result = task(job)
+            job.status = 'cancelled' if job.cancelled else 'done'
+        except Exception as e:
+            job.error = str(e)
+            job.status = 'failed'
+        finally:
+            job.finished_at = time.time()
+
+    def get(self, job_id):
+        return self.jobs.get(job_id)
+
+    def list(self):
+        with self._lock:
+            return list(self.jobs.values())
+
+
+job_manager = JobManager()
+
+# Pool for the independent steps of auto-optimize, kept separate from the
+# job pool so a parent job can never wait on steps queued behind it
+optimize_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix='optimize')
+
+
+# Pool for cleaning independent top-level directories in parallel
+clean_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix='clean')
+
+
+class CleanStats:
+    """Byte and file counts from one cleaning pass"""
+    __slots__ = ('bytes_found', 'bytes_freed', 'files_found', 'files_deleted', 'files_skipped')
+
+    def __init__(self):
+        self.bytes_found = 0
+        self.bytes_freed = 0
+        self.files_found = 0
+        self.files_deleted = 0
+        self.files_skipped = 0
+
+    def merge(self, other):
+        for name in self.__slots__:
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+
+
+def _is_junction(entry):
+    """True for Windows directory junctions (DirEntry.is_junction is 3.12+)"""
+    is_junction = getattr(entry, 'is_junction', None)
+    return bool(is_junction and is_junction())
+
+
+def _is_real_dir(entry):
+    """True for directories we should descend into (not links or junctions)"""
+    try:
+        return entry.is_dir(follow_symlinks=False) and not _is_junction(entry)
+    except OSError:
+        return False
+
+
+def _clean_file(entry, job, dry_run, stats):
+    """Size one non-directory entry from its cached stat and delete it"""
+    try:
+        size = entry.stat(follow_symlinks=False).st_size
+    except OSError:
+        stats.files_skipped += 1
+        return 0
+    stats.files_found += 1
+    stats.bytes_found += size
+    if dry_run:
+        return size
+    
+    try:
+        if _is_junction(entry):
+            os.rmdir(entry.path)
+        else:
+            try:
+                os.unlink(entry.path)
+            except PermissionError:
+                # Read-only files cannot be deleted on Windows until made writable
+                os.chmod(entry.path, stat.S_IWRITE)
+                os.unlink(entry.path)
+    except OSError:
+        stats.files_skipped += 1
+        return 0
+    stats.files_deleted += 1
+    stats.bytes_freed += size
+    return size
+
+
+def _clean_dir(path, job, dry_run, stats):
+    """Size and delete everything below path in a single os.scandir pass"""
+    processed_bytes = 0
+    processed_files = 0
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if job.cancelled:
+                    break
+                if _is_real_dir(entry):
+                    _clean_dir(entry.path, job, dry_run, stats)
+                    if not dry_run and not job.cancelled:
+                        try:
+                            os.rmdir(entry.path)
+                        except OSError:
+                            # Still holds files that could not be deleted
+                            pass
+                else:
+                    processed_bytes += _clean_file(entry, job, dry_run, stats)
+                    processed_files += 1
+    except OSError:
+        stats.files_skipped += 1
+    # Report progress once per directory rather than once per file
+    job.add_progress(processed_bytes, processed_files)
+
+
+def _clean_subtree(path, job, dry_run):
+    stats = CleanStats()
+    _clean_dir(path, job, dry_run, stats)
+    if not dry_run and not job.cancelled:
+        try:
+            os.rmdir(path)
+        except OSError:
+            pass
+    return stats
+
+
+def clean_paths(roots, job=None, dry_run=False, remove_roots=False):
+    """Size and (unless dry_run) delete the contents of each root directory
+    
+    Every file is stat'ed once, from the os.scandir DirEntry cache, and
+    deleted in the same pass. Files directly inside a root are handled
+    inline; each top-level subdirectory is cleaned as its own task on
+    clean_pool. Returns (CleanStats, errors).
+    """
+    job = job or Job('clean')
+    stats = CleanStats()
+    errors = []
+    futures = []
+    
+    # The same folder is often reachable under two names (e.g. %TEMP%)
+    unique_roots = list(OrderedDict(
+        (os.path.normcase(os.path.realpath(root)), root) for root in roots if root
+    ).values())
+    
+    for root in unique_roots:
+        if not os.path.isdir(root):
+            continue
+        try:
+            with os.scandir(root) as entries:
+                for entry in entries:
+                    if job.cancelled:
+                        break
+                    if _is_real_dir(entry):
+                        futures.append(clean_pool.submit(_clean_subtree, entry.path, job, dry_run))
+                    else:
+                        job.add_progress(_clean_file(entry, job, dry_run, stats), 1)
+        except OSError as e:
+            errors.append(f"Error accessing {root}: {str(e)}")
+    
+    for future in futures:
+        try:
+            stats.merge(future.result())
+        except Exception as e:
+            errors.append(str(e))
+    
+    if remove_roots and not dry_run and not job.cancelled:
+        for root in unique_roots:
+            try:
+                os.rmdir(root)
+            except OSError:
+                pass
+    
+    return stats, errors
+
+
+def _clean_result(stats, errors, job, dry_run):
+    return {
+        'success': True,
+        'dry_run': dry_run,
+        'cleared_mb': round(stats.bytes_freed / (1024 * 1024), 2),
+        'reclaimable_mb': round(stats.bytes_found / (1024 * 1024), 2),
+        'files_deleted': stats.files_deleted,
+        'files_found': stats.files_found,
+        'files_skipped': stats.files_skipped,
+        'errors': errors,
+        'cancelled': job.cancelled
+    }
+
+
+def _local_appdata_path(*parts):
+    """Path under %LOCALAPPDATA%, or None when it is not set"""
+    base = os.environ.get('LOCALAPPDATA')
+    return os.path.join(base, *parts) if base else None
+
+
+@timed('optimize', 'temp-files')
+def run_clear_temp_files(job=None, dry_run=False):
+    """Clear Windows temporary files"""
+    job = job or Job('temp-files')
+    
+    # Get temp directories
+    temp_dirs = [
+        tempfile.gettempdir(),
+        _local_appdata_path('Temp'),
+    ]
+    
+    stats, errors = clean_paths(temp_dirs, job, dry_run=dry_run)
+    return _clean_result(stats, errors, job, dry_run)
+
+
+@timed('optimize', 'browser-cache')
+def run_clear_browser_cache(job=None, dry_run=False):
+    """Clear Chrome and Edge browser cache"""
+    job = job or Job('browser-cache')
+    
+    # Browser cache paths
+    cache_paths = [
+        _local_appdata_path('Google', 'Chrome', 'User Data', 'Default', 'Cache'),
+        _local_appdata_path('Google', 'Chrome', 'User Data', 'Default', 'Code Cache'),
+        _local_appdata_path('Microsoft', 'Edge', 'User Data', 'Default', 'Cache'),
+        _local_appdata_path('Microsoft', 'Edge', 'User Data', 'Default', 'Code Cache'),
+    ]
+    
+    stats, errors = clean_paths(cache_paths, job, dry_run=dry_run, remove_roots=True)
+    return _clean_result(stats, errors, job, dry_run)
+
+
+@timed('optimize', 'recycle-bin')
+def run_empty_recycle_bin(job=None, dry_run=False):
+    """Empty Windows Recycle Bin"""
+    if platform.system() != 'Windows':
+        return {
+            'success': False,
+            'error': 'Only supported on Windows'
+        }
+    
+    import ctypes
+    
+    class SHQUERYRBINFO(ctypes.Structure):
+        _fields_ = [('cbSize', ctypes.c_ulong),
+                    ('i64Size', ctypes.c_int64),
+                    ('i64NumItems', ctypes.c_int64)]
+    
+    # Measure the bin (all drives) so the result reports real sizes
+    info = SHQUERYRBINFO()
+    info.cbSize = ctypes.sizeof(SHQUERYRBINFO)
+    ctypes.windll.shell32.SHQueryRecycleBinW(None, ctypes.byref(info))
+    
+    if not dry_run:
+        # Use Windows API to empty recycle bin
+        ctypes.windll.shell32.SHEmptyRecycleBinW(None, None, 0x0001 | 0x0002 | 0x0004)
+    
+    return {
+        'success': True,
+        'dry_run': dry_run,
+        'cleared_mb': 0 if dry_run else round(info.i64Size / (1024 * 1024), 2),
+        'reclaimable_mb': round(info.i64Size / (1024 * 1024), 2),
+        'files_found': info.i64NumItems,
+        'message': 'Recycle Bin measured' if dry_run else 'Recycle Bin emptied successfully'
+    }
+
+
+@timed('optimize', 'auto-optimize')
+def run_auto_optimize(job=None, dry_run=False):
+    """Run all safe optimizations, with the independent steps in parallel"""
+    job = job or Job('auto-optimize')
+    results = {
+        'success': True,
+        'dry_run': dry_run,
+        'actions': [],
+        'total_cleared_mb': 0,
+        'total_reclaimable_mb': 0,
+        'errors': []
+    }
+    
+    # The steps share the parent job, so progress and cancellation cover all of them
+    steps = [
+        ('Temp files', run_clear_temp_files),
+        ('Browser cache', run_clear_browser_cache),
+        ('Recycle bin', run_empty_recycle_bin),
+    ]
+    futures = [(label, optimize_pool.submit(task, job, dry_run)) for label, task in steps]
+    
+    for label, future in futures:
+        try:
+            data = future.result()
+        except Exception as e:
+            results['errors'].append(f"{label}: {str(e)}")
+            continue
+        if not data['success']:
+            continue
+        if dry_run:
+            results['actions'].append(f"Found {data['reclaimable_mb']}MB reclaimable in {label.lower()}")
+        elif label == 'Recycle bin':
+            results['actions'].append("Emptied Recycle Bin")
+        else:
+            results['actions'].append(f"Cleared {data['cleared_mb']}MB {label.lower()}")
+        results['total_cleared_mb'] += data['cleared_mb']
+        results['total_reclaimable_mb'] += data['reclaimable_mb']
+    
+    results['total_cleared_mb'] = round(results['total_cleared_mb'], 2)
+    results['total_reclaimable_mb'] = round(results['total_reclaimable_mb'], 2)
+    results['cancelled'] = job.cancelled
+    return results
+
+
+def _windows_reclaim_targets():
+    """Largest working sets, from the process table"""
+    process_table.refresh()
+    return [{'id': entry.pid, 'name': entry.name, 'size': entry.rss}
+            for entry in process_table.top(RECLAIM_MAX_TARGETS, key='rss')
+            if entry.pid > 4 and (entry.rss or 0) >= RECLAIM_MIN_MB * 1024 * 1024]
+
+
+def _windows_trim(target):
+    """Empty one process's working set; returns (before, after) RSS bytes"""
+    import ctypes
+    PROCESS_QUERY_LIMITED_INFORMATION = 0x1000
+    PROCESS_SET_QUOTA = 0x0100
+    
+    process = psutil.Process(target['id'])
+    before = process.memory_info().rss
+    handle = ctypes.windll.kernel32.OpenProcess(
+        PROCESS_QUERY_LIMITED_INFORMATION | PROCESS_SET_QUOTA, False, target['id'])
+    if not handle:
+        raise PermissionError(f"cannot open process {target['id']}")
+    try:
+        if not ctypes.windll.psapi.EmptyWorkingSet(handle):
+            raise OSError(ctypes.GetLastError(), 'EmptyWorkingSet failed')
+    finally:
+        ctypes.windll.kernel32.CloseHandle(handle)
+    return before, process.memory_info().rss
+
+
+CGROUP_ROOT = '/sys/fs/cgroup'
+
+
+def _read_cgroup(path, name):
+    with open(os.path.join(path, name)) as f:
+        return f.read()
+
+
+def _cgroup_reclaimable(path):
+    """Page cache a cgroup could give back (inactive file pages), in bytes"""
+    for line in _read_cgroup(path, 'memory.stat').splitlines():
+        key, _, value = line.partition(' ')
+        if key == 'inactive_file':
+            return int(value)
+    return 0
+
+
+def _linux_reclaim_targets():
+    """Leaf cgroups (cgroup v2) with the most reclaimable page cache
+    
+    Only leaves are picked so a parent and its children are never both
+    counted for the same memory.
+    """
+    targets = []
+    for path, dirs, files in os.walk(CGROUP_ROOT):
+        if 'memory.reclaim' not in files or path == CGROUP_ROOT:
+            continue
+        if any(os.path.exists(os.path.join(path, d, 'memory.reclaim')) for d in dirs):
+            continue
+        try:
+            size = _cgroup_reclaimable(path)
+        except (OSError, ValueError):
+            continue
+        if size >= RECLAIM_MIN_MB * 1024 * 1024:
+            targets.append({'id': os.path.relpath(path, CGROUP_ROOT), 'name': os.path.basename(path), 'size': size})
+    return heapq.nlargest(RECLAIM_MAX_TARGETS, targets, key=lambda t: t['size'])
+
+
+def _linux_trim(target):
+    """Ask the kernel to reclaim a cgroup's inactive page cache; returns (before, after) usage"""
+    path = os.path.join(CGROUP_ROOT, target['id'])
+    before = int(_read_cgroup(path, 'memory.current'))
+    try:
+        with open(os.path.join(path, 'memory.reclaim'), 'w') as f:
+            f.write(str(target['size']))
+    except BlockingIOError:
+        # EAGAIN: the kernel reclaimed less than asked, which is still a result
+        pass
+    return before, int(_read_cgroup(path, 'memory.current'))
+
+
+def _drop_page_cache():
+    """Drop clean page cache system-wide if running as root; False if not permitted"""
+    if not hasattr(os, 'geteuid') or os.geteuid() != 0:
+        return False
+    os.sync()
+    try:
+        with open('/proc/sys/vm/drop_caches', 'w') as f:
+            f.write('1')
+    except OSError:
+        return False
+    return True
+
+
+@timed('optimize', 'ram-cache')
+def run_reclaim_memory(job=None, dry_run=False):
+    """Reclaim memory from the largest processes (Windows) or cgroups (Linux)
+    
+    Only the biggest targets are trimmed, a few at a time, and every result
+    is measured from before/after readings rather than assumed.
+    """
+    job = job or Job('ram-cache')
+    system = platform.system()
+    if system == 'Windows':
+        find_targets, trim = _windows_reclaim_targets, _windows_trim
+    elif system == 'Linux':
+        find_targets, trim = _linux_reclaim_targets, _linux_trim
+    else:
+        return {
+            'success': False,
+            'error': 'Only supported on Windows and Linux'
+        }
+    
+    targets = find_targets()
+    available_before = psutil.virtual_memory().available
+    results = []
+    errors = []
+    
+    if not dry_run:
+        def trim_target(target):
+            if job.cancelled:
+                return None
+            before, after = trim(target)
+            job.add_progress(bytes_processed=max(0, before - after), files_processed=1)
+            return before, after
+        
+        with ThreadPoolExecutor(max_workers=RECLAIM_WORKERS, thread_name_prefix='reclaim') as pool:
+            futures = [(target, pool.submit(trim_target, target)) for target in targets]
+        for target, future in futures:
+            try:
+                measured = future.result()
+            except (psutil.Error, OSError) as e:
+                errors.append(f"{target['name']}: {str(e)}")
+                continue
+            if measured is not None:
+                results.append((target, measured))
+    
+    dropped_cache = False
+    if system == 'Linux' and not dry_run and not job.cancelled:
+        dropped_cache = _drop_page_cache()
+    available_after = psutil.virtual_memory().available
+    
+    reclaimed = sum(max(0, before - after) for _, (before, after) in results)
+    mb = lambda n: round(n / (1024 * 1024), 2)
+    kind = 'processes' if system == 'Windows' else 'cgroups'
+    if dry_run:
+        message = f"{len(targets)} {kind} selected for reclaim"
+    else:
+        message = f"Reclaimed {mb(reclaimed)}MB from {len(results)} {kind}"
+    return {
+        'success': True,
+        'dry_run': dry_run,
+        'message': message,
+        'note': 'Some targets need administrator privileges' if errors else None,
+        'method': 'EmptyWorkingSet' if system == 'Windows' else 'cgroup memory.reclaim',
+        'cleared_mb': mb(reclaimed),
+        'reclaimable_mb': mb(sum(t['size'] for t in targets)),
+        'targets': [{'target': t['id'], 'name': t['name'], 'size_mb': mb(t['size'])} for t in targets]
+                   if dry_run else
+                   [{'target': t['id'], 'name': t['name'], 'before_mb': mb(before), 'after_mb': mb(after),
+                     'reclaimed_mb': mb(max(0, before - after))} for t, (before, after) in results],
+        'page_cache_dropped': dropped_cache,
+        'available_before_mb': mb(available_before),
+        'available_after_mb': mb(available_after),
+        'errors': errors,
+        'cancelled': job.cancelled
+    }
+
+
+# Tasks that can be run as background jobs, by URL name
+OPTIMIZATION_TASKS = {
+    'temp-files': run_clear_temp_files,
+    'browser-cache': run_clear_browser_cache,
+    'recycle-bin': run_empty_recycle_bin,
+    'ram-cache': run_reclaim_memory,
+    'auto-optimize': run_auto_optimize,
+}
+
+
+# ============================================================================
+# DISK USAGE INDEX
+# ============================================================================
+
+class DirNode:
+    """One directory in the disk usage tree"""
+    __slots__ = ('mtime', 'file_bytes', 'file_count', 'top_files', 'children', 'total_bytes')
+
+    def __init__(self, mtime):
+        self.mtime = mtime
+        self.file_bytes = 0
+        self.file_count = 0
+        self.top_files = []
+        self.children = {}
+        self.total_bytes = 0
 
-        response = model.generate_content(prompt)
-        response_text = response.text.strip()
+
+class DiskUsageIndex:
+    """Directory-size tree that is persisted and refreshed incrementally
+    
+    A directory's mtime changes whenever an entry is added, removed or
+    renamed in it, so a refresh only re-lists directories whose mtime
+    differs from the stored one and reuses the stored file totals for the
+    rest. Files that grow in place do not change their directory's mtime;
+    refresh(full=True) picks those up.
+    """
+
+    TOP_FILES_PER_DIR = 10
+    RANKING_SIZE = 100
+
+    def __init__(self, roots=DISK_INDEX_ROOTS, path=None):
+        self.roots = roots
+        self.path = path or os.path.join(DATA_DIR, 'disk_index.json.gz')
+        self.trees = {}
+        self.largest_dirs = []
+        self.largest_files = []
+        self.built_at = None
+        self.last_stats = {}
+        self.job = None
+        self._loaded = False
+        # Trees are built without holding _lock and swapped in under it, so
+        # top() and load() never wait for a walk; _refresh_lock keeps two
+        # refreshes from walking at once
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+
+    def load(self):
+        """Load the persisted index, if there is one"""
+        if self._loaded:
+            return
+        trees = {}
+        built_at = None
+        try:
+            with gzip.open(self.path, 'rt', encoding='utf-8') as f:
+                stored = json.load(f)
+        except (OSError, ValueError):
+            stored = {}
         
-        # Remove markdown code blocks if present
-        if response_text.startswith('```'):
-            response_text = response_text.split('```')[1]
-            if response_text.startswith('json'):
-                response_text = response_text[4:]
-            response_text = response_text.strip()
+        for root, records in stored.get('trees', {}).items():
+            nodes = {}
+            # Records are stored parents-first as [relpath, mtime, bytes, count, top_files]
+            for relpath, mtime, file_bytes, file_count, top_files in records:
+                node = DirNode(mtime)
+                node.file_bytes = file_bytes
+                node.file_count = file_count
+                node.top_files = [tuple(f) for f in top_files]
+                nodes[relpath] = node
+                if relpath:
+                    parent, name = os.path.split(relpath)
+                    nodes[parent].children[name] = node
+            if '' in nodes:
+                trees[root] = nodes['']
+        if trees:
+            built_at = stored.get('built_at')
+        largest_dirs, largest_files = self._rank(trees)
         
-        return json.loads(response_text)
+        with self._lock:
+            if self._loaded:
+                return
+            self.trees = trees
+            self.built_at = built_at
+            self.largest_dirs, self.largest_files = largest_dirs, largest_files
+            self._loaded = True
 
+    def save(self, trees=None):
+        """Write the index atomically in a compact gzipped form"""
+        trees_records = {}
+        for root, tree in (self.trees if trees is None else trees).items():
+            records = []
+            stack = [('', tree)]
+            while stack:
+                relpath, node = stack.pop()
+                records.append([relpath, node.mtime, node.file_bytes, node.file_count, node.top_files])
+                stack.extend((os.path.join(relpath, name) if relpath else name, child)
+                             for name, child in node.children.items())
+            trees_records[root] = records
+        
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+            json.dump({'built_at': self.built_at, 'trees': trees_records}, f, separators=(',', ':'))
+        os.replace(tmp_path, self.path)
 
-@app.route('/')
-def index():
-    """Serve the dashboard"""
-    return render_template('index.html')
+    def refresh(self, job=None, full=False):
+        """Re-walk changed directories of every root and persist the index"""
+        self.load()
+        job = job or Job('disk-index')
+        with self._refresh_lock:
+            counters = {'dirs_scanned': 0, 'dirs_reused': 0}
+            started = time.perf_counter()
+            trees = {}
+            for root in self.roots:
+                try:
+                    st = os.stat(root)
+                except OSError:
+                    continue
+                old = None if full else self.trees.get(root)
+                trees[root] = self._walk(root, st.st_mtime, old, st.st_dev, counters, job)
+            
+            if job.cancelled:
+                return self.last_stats
+            counters['duration_s'] = round(time.perf_counter() - started, 2)
+            # Nothing re-listed and no root gone: the stored index is still exact
+            changed = counters['dirs_scanned'] > 0 or trees.keys() != self.trees.keys()
+            largest_dirs, largest_files = self._rank(trees) if changed else (self.largest_dirs, self.largest_files)
+            
+            with self._lock:
+                self.trees = trees
+                self.largest_dirs, self.largest_files = largest_dirs, largest_files
+                self.built_at = time.time()
+                self.last_stats = counters
+            if changed:
+                self.save(trees)
+            return counters
 
-@app.route('/api/scan', methods=['POST'])
-def scan_system():
-    """Run system diagnostic and return results"""
-    try:
-        diagnostic = PCDiagnostic()
+    def _walk(self, path, mtime, node, device, counters, job):
+        if job.cancelled:
+            return node or DirNode(None)
         
-        # Collect all diagnostic data
-        diagnostic_data = diagnostic.collect_all_diagnostics()
+        if node is None or node.mtime != mtime:
+            old_children = node.children if node else {}
+            node = DirNode(mtime)
+            top_files = []
+            try:
+                with os.scandir(path) as entries:
+                    for entry in entries:
+                        if _is_real_dir(entry):
+                            node.children[entry.name] = old_children.get(entry.name)
+                            continue
+                        try:
+                            size = entry.stat(follow_symlinks=False).st_size
+                        except OSError:
+                            continue
+                        node.file_bytes += size
+                        node.file_count += 1
+                        if len(top_files) < self.TOP_FILES_PER_DIR:
+                            heapq.heappush(top_files, (size, entry.name))
+                        elif size > top_files[0][0]:
+                            heapq.heapreplace(top_files, (size, entry.name))
+            except OSError:
+                pass
+            node.top_files = sorted(top_files, reverse=True)
+            counters['dirs_scanned'] += 1
+            job.add_progress(node.file_bytes, node.file_count)
+        else:
+            counters['dirs_reused'] += 1
+            # Copy so the tree being served is not modified until the swap
+            node = copy.copy(node)
+            node.children = dict(node.children)
         
-        # Get AI analysis
-        ai_analysis = diagnostic.analyze_with_gemini()
+        # Subdirectory changes do not touch this directory's mtime, so every
+        # child is still checked - but with one stat instead of a listing
+        for name, child in list(node.children.items()):
+            child_path = os.path.join(path, name)
+            try:
+                st = os.stat(child_path, follow_symlinks=False)
+            except OSError:
+                del node.children[name]
+                continue
+            if st.st_dev != device:
+                # Other filesystems (network shares, removable drives) are skipped
+                del node.children[name]
+                continue
+            node.children[name] = self._walk(child_path, st.st_mtime, child, device, counters, job)
+        return node
+
+    def _rank(self, trees):
+        """Compute totals and return the largest directories and files"""
+        dirs = []
+        files = []
+        for root, tree in trees.items():
+            stack = [(root, tree, False)]
+            while stack:
+                path, node, visited = stack.pop()
+                if not visited:
+                    stack.append((path, node, True))
+                    stack.extend((os.path.join(path, name), child, False)
+                                 for name, child in node.children.items())
+                    continue
+                node.total_bytes = node.file_bytes + sum(c.total_bytes for c in node.children.values())
+                if path != root:
+                    dirs.append((node.total_bytes, path))
+                files.extend((size, os.path.join(path, name)) for size, name in node.top_files)
         
-        # Combine results
-        result = {
-            'success': True,
-            'diagnostic_data': diagnostic_data,
-            'ai_analysis': ai_analysis,
-            'scan_time': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        return heapq.nlargest(self.RANKING_SIZE, dirs), heapq.nlargest(self.RANKING_SIZE, files)
+
+    def refresh_in_background(self, min_interval=DISK_INDEX_INTERVAL, full=False):
+        """Start a refresh job unless one is running or the index is fresh"""
+        if self.job is not None and self.job.finished_at is None:
+            return self.job
+        if self.built_at and time.time() - self.built_at < min_interval:
+            return None
+        self.job = job_manager.submit('disk-index', functools.partial(self.refresh, full=full))
+        return self.job
+
+    def top(self, n=20):
+        """Largest directories and files from the index, without touching the disk"""
+        return {
+            'roots': self.roots,
+            'indexed_at': datetime.fromtimestamp(self.built_at).strftime("%Y-%m-%d %H:%M:%S") if self.built_at else None,
+            'largest_directories': [{'path': path, 'size_mb': round(size / (1024**2), 1)}
+                                    for size, path in self.largest_dirs[:n]],
+            'largest_files': [{'path': path, 'size_mb': round(size / (1024**2), 1)}
+                              for size, path in self.largest_files[:n]],
+            'last_refresh': self.last_stats
         }
+
+
+disk_index = DiskUsageIndex()
+
+
+# ============================================================================
+# FLEET MODE
+# ============================================================================
+
+# Largest decompressed ingest body accepted from one agent request
+FLEET_MAX_INGEST_BYTES = 32 * 1024 * 1024
+
+
+def _fleet_number(value):
+    """A finite float or None; ValueError for anything else, so the snapshot is rejected"""
+    if value is None:
+        return None
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+        raise ValueError(f'not a number: {value!r}')
+    return float(value)
+
+
+def summarize_snapshot(snapshot):
+    """Pull the columns fleet views sort on out of one agent snapshot
+    
+    Raises ValueError, TypeError, KeyError or AttributeError for malformed
+    snapshots, so ingest rejects them instead of the writer failing later.
+    """
+    data = snapshot['data']
+    partitions = data.get('disk', {}).get('partitions', [])
+    fullest = max(partitions, key=lambda p: _fleet_number(p.get('usage_percent')) or 0, default={})
+    mount = fullest.get('mountpoint')
+    return (
+        str(snapshot['host'])[:255],
+        _fleet_number(snapshot['timestamp']),
+        _fleet_number(data.get('cpu', {}).get('current_usage_percent')),
+        _fleet_number(data.get('memory', {}).get('usage_percent')),
+        _fleet_number(data.get('memory', {}).get('swap_percent')),
+        _fleet_number(fullest.get('usage_percent')),
+        str(mount)[:255] if mount is not None else None,
+        _fleet_number(fullest.get('free_gb')),
+        _fleet_number(data.get('processes', {}).get('total_running')),
+    )
+
+
+class FleetStore:
+    """SQLite store for snapshots pushed by fleet agents
+    
+    Ingest only parses and queues; a single writer thread drains the queue
+    and writes each batch in one transaction. That keeps ingest requests
+    short and SQLite write contention at one writer, however many agents
+    are pushing at once.
+    """
+
+    COLUMNS = ['host', 'timestamp', 'cpu_percent', 'memory_percent', 'swap_percent',
+               'fullest_disk_percent', 'fullest_disk_mount', 'fullest_disk_free_gb', 'process_count']
+    SORTS = {
+        'memory': 'memory_percent DESC, swap_percent DESC',
+        'swap': 'swap_percent DESC',
+        'cpu': 'cpu_percent DESC',
+        'disk': 'fullest_disk_percent DESC',
+        'stale': 'timestamp ASC',
+    }
+
+    def __init__(self, path=None, retention_days=FLEET_RETENTION_DAYS, max_queue=100000):
+        self.path = path or os.path.join(DATA_DIR, 'fleet.db')
+        self.retention = retention_days * 86400
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.dropped = 0
+        self._local = threading.local()
+        self._last_prune = 0.0
         
-        return jsonify(result)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        columns = ', '.join(self.COLUMNS[1:])
+        with self._connect() as db:
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute(f'CREATE TABLE IF NOT EXISTS hosts (host TEXT PRIMARY KEY, {columns}, snapshot BLOB)')
+            db.execute(f'CREATE TABLE IF NOT EXISTS snapshots (host TEXT, {columns})')
+            db.execute('CREATE INDEX IF NOT EXISTS snapshots_host_time ON snapshots (host, timestamp)')
+            db.execute('CREATE INDEX IF NOT EXISTS snapshots_time ON snapshots (timestamp)')
         
-    except Exception as e:
-        return jsonify({
-            'success': False,
-            'error': str(e)
-        }), 500
+        self._writer = threading.Thread(target=self._write_loop, name='fleet-writer', daemon=True)
+        self._writer.start()
 
-@app.route('/api/quick-stats', methods=['GET'])
-def quick_stats():
-    """Get quick system stats without full analysis"""
-    try:
-        cpu_percent = psutil.cpu_percent(interval=1)
-        memory = psutil.virtual_memory()
-        disk = psutil.disk_usage('/')
-        
-        return jsonify({
-            'success': True,
-            'stats': {
-                'cpu_percent': cpu_percent,
-                'memory_percent': memory.percent,
-                'disk_percent': disk.percent
-            }
-        })
-    except Exception as e:
-        return jsonify({
-            'success': False,
-            'error': str(e)
-        }), 500
+    def _connect(self):
+        import sqlite3
+        return sqlite3.connect(self.path, timeout=30)
+
+    def _reader(self):
+        """Per-thread read connection"""
+        import sqlite3
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = self._local.db = self._connect()
+            db.row_factory = sqlite3.Row
+        return db
+
+    def ingest(self, snapshots):
+        """Queue snapshots for writing; returns how many were accepted"""
+        accepted = 0
+        for snapshot in snapshots:
+            try:
+                self.queue.put_nowait((summarize_snapshot(snapshot), snapshot['data']))
+                accepted += 1
+            except queue.Full:
+                self.dropped += 1
+            except (KeyError, TypeError, ValueError, AttributeError):
+                continue
+        return accepted
+
+    def _write_loop(self):
+        import sqlite3
+        db = self._connect()
+        while True:
+            batch = [self.queue.get()]
+            # Drain whatever else is waiting so it all goes in one transaction
+            while len(batch) < 5000:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            
+            try:
+                self._write(db, batch)
+            except (sqlite3.Error, ValueError, TypeError):
+                # One bad row must not cost the rest of the batch; retry them one by one
+                for item in batch:
+                    try:
+                        self._write(db, [item])
+                    except (sqlite3.Error, ValueError, TypeError):
+                        self.dropped += 1
+
+    def _write(self, db, batch):
+        """Write a batch of (row, data) pairs in one transaction"""
+        placeholders = ', '.join('?' * len(self.COLUMNS))
+        latest = {}
+        for row, data in batch:
+            if row[0] not in latest or row[1] >= latest[row[0]][0][1]:
+                latest[row[0]] = (row, data)
+        with db:
+            db.executemany(f'INSERT INTO snapshots VALUES ({placeholders})', [row for row, _ in batch])
+            db.executemany(
+                f'INSERT INTO hosts VALUES ({placeholders}, ?) '
+                f'ON CONFLICT(host) DO UPDATE SET '
+                + ', '.join(f'{c}=excluded.{c}' for c in self.COLUMNS[1:] + ['snapshot'])
+                + ' WHERE excluded.timestamp >= hosts.timestamp',
+                # Only the newest full snapshot per host is kept, so only it is compressed
+                [row + (zlib.compress(json.dumps(data, separators=(',', ':')).encode('utf-8')),)
+                 for row, data in latest.values()])
+            if time.time() - self._last_prune > 3600:
+                db.execute('DELETE FROM snapshots WHERE timestamp < ?', (time.time() - self.retention,))
+                self._last_prune = time.time()
+
+    def hosts(self, sort='memory', limit=20):
+        """Latest state of each host, worst first by the chosen column"""
+        order = self.SORTS.get(sort, self.SORTS['memory'])
+        rows = self._reader().execute(
+            f'SELECT {", ".join(self.COLUMNS)} FROM hosts ORDER BY {order} LIMIT ?', (limit,)).fetchall()
+        return [dict(row) for row in rows]
+
+    def host(self, host, history_seconds=86400):
+        """Latest full snapshot of one host plus its recent summary rows"""
+        db = self._reader()
+        row = db.execute('SELECT * FROM hosts WHERE host = ?', (host,)).fetchone()
+        if row is None:
+            return None
+        result = {c: row[c] for c in self.COLUMNS}
+        result['snapshot'] = json.loads(zlib.decompress(row['snapshot']))
+        result['history'] = [dict(r) for r in db.execute(
+            f'SELECT {", ".join(self.COLUMNS[1:])} FROM snapshots WHERE host = ? AND timestamp >= ? ORDER BY timestamp',
+            (host, time.time() - history_seconds))]
+        return result
+
+    def summary(self, stale_after=600):
+        row = self._reader().execute(
+            'SELECT COUNT(*) AS hosts, AVG(cpu_percent) AS avg_cpu_percent, '
+            'AVG(memory_percent) AS avg_memory_percent, MAX(fullest_disk_percent) AS max_disk_percent, '
+            'SUM(timestamp < ?) AS stale_hosts FROM hosts', (time.time() - stale_after,)).fetchone()
+        result = {key: (round(row[key], 1) if isinstance(row[key], float) else row[key]) for key in row.keys()}
+        result['queued'] = self.queue.qsize()
+        result['dropped'] = self.dropped
+        return result
+
+
+fleet_store = None
+
+
+def enable_fleet_aggregator(path=None):
+    """Turn on aggregator mode so this server accepts agent snapshots"""
+    global fleet_store
+    if fleet_store is None:
+        fleet_store = FleetStore(path)
+    return fleet_store
+
+
+class FleetAgent:
+    """Collect snapshots on a schedule and push them to an aggregator in batches
+    
+    Snapshots are buffered (bounded, oldest dropped first) and sent as one
+    gzip-compressed NDJSON request every batch_size snapshots, so an
+    unreachable aggregator only delays delivery.
+    """
+
+    def __init__(self, server, interval=60.0, batch_size=5, host_id=None,
+                 token=FLEET_TOKEN, max_buffer=1000):
+        self.url = server.rstrip('/') + '/api/fleet/ingest'
+        self.interval = interval
+        self.batch_size = batch_size
+        self.host_id = host_id or platform.node()
+        self.token = token
+        self.buffer = deque(maxlen=max_buffer)
+
+    def snapshot(self):
+        # Aggregators only keep the summary columns and latest snapshot, so
+        # skip the directory index walk and the dashboard-only sections
+        diagnostic = PCDiagnostic(extras=False)
+        return {
+            'host': self.host_id,
+            'timestamp': time.time(),
+            'data': diagnostic.collect_all_diagnostics()
+        }
+
+    def flush(self):
+        """Send buffered snapshots; returns True if the aggregator accepted them"""
+        import urllib.request
+        if not self.buffer:
+            return True
+        batch = list(self.buffer)
+        body = gzip.compress('\n'.join(json.dumps(s, separators=(',', ':')) for s in batch).encode('utf-8'))
+        headers = {'Content-Type': 'application/x-ndjson', 'Content-Encoding': 'gzip'}
+        if self.token:
+            headers['X-PCDoctor-Token'] = self.token
+        try:
+            with urllib.request.urlopen(urllib.request.Request(self.url, body, headers), timeout=30) as response:
+                if response.status >= 300:
+                    return False
+        except OSError:
+            return False
+        for _ in batch:
+            self.buffer.popleft()
+        return True
+
+    def run(self, stop_event=None):
+        stop_event = stop_event or threading.Event()
+        sampler.start()
+        process_table.refresh(force=True)
+        while not stop_event.is_set():
+            try:
+                self.buffer.append(self.snapshot())
+            except Exception:
+                pass
+            if len(self.buffer) >= self.batch_size:
+                self.flush()
+            stop_event.wait(self.interval)
+        self.flush()
 
 
 # ============================================================================
 # AUTOMATION ENDPOINTS
 # ============================================================================
 
+def _dry_run_requested():
+    """True if the request asks to only measure (?dry_run=1 or {"dry_run": true})"""
+    if request.args.get('dry_run') in ('1', 'true'):
+        return True
+    body = request.get_json(silent=True) or {}
+    return bool(body.get('dry_run'))
+
+
 @app.route('/api/optimize/temp-files', methods=['POST'])
 def clear_temp_files():
     """Clear Windows temporary files"""
     try:
-        import tempfile
-        import shutil
-        from pathlib import Path
-        
-        cleared_mb = 0
-        files_deleted = 0
-        errors = []
-        
-        # Get temp directories
-        temp_dirs = [
-            tempfile.gettempdir(),
-            os.path.join(os.environ.get('LOCALAPPDATA', ''), 'Temp'),
-        ]
-        
-        for temp_dir in temp_dirs:
-            if os.path.exists(temp_dir):
-                try:
-                    for item in os.listdir(temp_dir):
-                        item_path = os.path.join(temp_dir, item)
-                        try:
-                            # Get size before deletion
-                            if os.path.isfile(item_path):
-                                size = os.path.getsize(item_path) / (1024 * 1024)
-                                os.remove(item_path)
-                                cleared_mb += size
-                                files_deleted += 1
-                            elif os.path.isdir(item_path):
-                                size = sum(f.stat().st_size for f in Path(item_path).rglob('*') if f.is_file()) / (1024 * 1024)
-                                shutil.rmtree(item_path, ignore_errors=True)
-                                cleared_mb += size
-                                files_deleted += 1
-                        except (PermissionError, OSError):
-                            continue
-                except Exception as e:
-                    errors.append(f"Error accessing {temp_dir}: {str(e)}")
-        
-        return jsonify({
-            'success': True,
-            'cleared_mb': round(cleared_mb, 2),
-            'files_deleted': files_deleted,
-            'errors': errors
-        })
-        
+        return jsonify(run_clear_temp_files(dry_run=_dry_run_requested()))
     except Exception as e:
         return jsonify({
             'success': False,
@@ -325,34 +3849,7 @@ def clear_temp_files():
 def clear_browser_cache():
     """Clear Chrome and Edge browser cache"""
     try:
-        cleared_mb = 0
-        errors = []
-        
-        # Browser cache paths
-        cache_paths = [
-            os.path.join(os.environ.get('LOCALAPPDATA', ''), 'Google', 'Chrome', 'User Data', 'Default', 'Cache'),
-            os.path.join(os.environ.get('LOCALAPPDATA', ''), 'Google', 'Chrome', 'User Data', 'Default', 'Code Cache'),
-            os.path.join(os.environ.get('LOCALAPPDATA', ''), 'Microsoft', 'Edge', 'User Data', 'Default', 'Cache'),
-            os.path.join(os.environ.get('LOCALAPPDATA', ''), 'Microsoft', 'Edge', 'User Data', 'Default', 'Code Cache'),
-        ]
-        
-        for cache_path in cache_paths:
-            if os.path.exists(cache_path):
-                try:
-                    # Calculate size
-                    size = sum(f.stat().st_size for f in Path(cache_path).rglob('*') if f.is_file()) / (1024 * 1024)
-                    # Delete cache
-                    shutil.rmtree(cache_path, ignore_errors=True)
-                    cleared_mb += size
-                except Exception as e:
-                    errors.append(f"Error clearing {cache_path}: {str(e)}")
-        
-        return jsonify({
-            'success': True,
-            'cleared_mb': round(cleared_mb, 2),
-            'errors': errors
-        })
-        
+        return jsonify(run_clear_browser_cache(dry_run=_dry_run_requested()))
     except Exception as e:
         return jsonify({
             'success': False,
@@ -364,21 +3861,8 @@ def clear_browser_cache():
 def empty_recycle_bin():
     """Empty Windows Recycle Bin"""
     try:
-        if platform.system() == 'Windows':
-            # Use Windows API to empty recycle bin
-            import ctypes
-            result = ctypes.windll.shell32.SHEmptyRecycleBinW(None, None, 0x0001 | 0x0002 | 0x0004)
-            
-            return jsonify({
-                'success': True,
-                'message': 'Recycle Bin emptied successfully'
-            })
-        else:
-            return jsonify({
-                'success': False,
-                'error': 'Only supported on Windows'
-            }), 400
-            
+        result = run_empty_recycle_bin(dry_run=_dry_run_requested())
+        return jsonify(result), 200 if result['success'] else 400
     except Exception as e:
         return jsonify({
             'success': False,
@@ -388,36 +3872,12 @@ def empty_recycle_bin():
 
 @app.route('/api/optimize/ram-cache', methods=['POST'])
 def clear_ram_cache():
-    """Clear RAM cache (Windows)"""
+    """Reclaim memory from the largest processes or cgroups, with measured results"""
     try:
-        if platform.system() == 'Windows':
-            # Clear standby list (requires admin privileges)
-            # This uses Windows EmptyStandbyList
-            result = {
-                'success': True,
-                'message': 'RAM cache cleared',
-                'note': 'Some operations require administrator privileges'
-            }
-            
-            # Try to clear working sets
-            try:
-                for proc in psutil.process_iter(['pid']):
-                    try:
-                        p = psutil.Process(proc.info['pid'])
-                        # This will cause Windows to trim the working set
-                        p.suspend()
-                        p.resume()
-                    except:
-                        continue
-            except:
-                pass
-                
-            return jsonify(result)
-        else:
-            return jsonify({
-                'success': False,
-                'error': 'Only supported on Windows'
-            }), 400
+        result = run_reclaim_memory(dry_run=_dry_run_requested())
+        if not result['success']:
+            return jsonify(result), 400
+        return jsonify(result)
             
     except Exception as e:
         return jsonify({
@@ -435,10 +3895,7 @@ def kill_process(pid):
         memory_percent = process.memory_percent()
         
         # Don't kill critical system processes
-        critical_processes = ['System', 'csrss.exe', 'smss.exe', 'services.exe', 
-                            'svchost.exe', 'lsass.exe', 'winlogon.exe', 'dwm.exe']
-        
-        if process_name in critical_processes:
+        if process_name in CRITICAL_PROCESSES:
             return jsonify({
                 'success': False,
                 'error': f'Cannot kill critical system process: {process_name}'
@@ -471,49 +3928,79 @@ def kill_process(pid):
         }), 500
 
 
-@app.route('/api/optimize/auto-optimize', methods=['POST'])
-def auto_optimize():
-    """Run all safe optimizations automatically"""
+@app.route('/api/process/kill-app/<int:pid>', methods=['POST'])
+def kill_app(pid):
+    """Kill every process of the app group that contains a PID
+    
+    This is the same group /api/apps and the dashboard show as one row, so
+    the memory and process count shown are what gets freed.
+    """
     try:
-        results = {
-            'success': True,
-            'actions': [],
-            'total_cleared_mb': 0,
-            'errors': []
-        }
+        process_table.refresh(force=True)
+        apps = aggregate_apps([entry for _, entry in process_table.items()])
+        app_info = next((a for a in apps if any(m.pid == pid for m in a['members'])), None)
+        if app_info is None:
+            return jsonify({
+                'success': False,
+                'error': 'Process not found'
+            }), 404
         
-        # 1. Clear temp files
-        try:
-            temp_result = clear_temp_files()
-            temp_data = temp_result.get_json()
-            if temp_data['success']:
-                results['actions'].append(f"Cleared {temp_data['cleared_mb']}MB temp files")
-                results['total_cleared_mb'] += temp_data['cleared_mb']
-        except Exception as e:
-            results['errors'].append(f"Temp files: {str(e)}")
+        members = app_info['members']
+        if app_info['name'] in CRITICAL_PROCESSES or any(m.name in CRITICAL_PROCESSES for m in members):
+            return jsonify({
+                'success': False,
+                'error': f"Cannot kill critical system process: {app_info['name']}"
+            }), 400
+        if any(m.pid == os.getpid() for m in members):
+            return jsonify({
+                'success': False,
+                'error': 'Cannot end PC Doctor itself'
+            }), 400
         
-        # 2. Clear browser cache
-        try:
-            cache_result = clear_browser_cache()
-            cache_data = cache_result.get_json()
-            if cache_data['success']:
-                results['actions'].append(f"Cleared {cache_data['cleared_mb']}MB browser cache")
-                results['total_cleared_mb'] += cache_data['cleared_mb']
-        except Exception as e:
-            results['errors'].append(f"Browser cache: {str(e)}")
+        # Never end a launcher above the requested process (e.g. Explorer), even if grouped with it
+        by_pid = {entry.pid: entry for _, entry in process_table.items()}
+        target = by_pid[pid]
+        ancestors = set()
+        seen = {target.pid}
+        parent = by_pid.get(target.ppid)
+        while parent is not None and parent.pid not in seen:
+            seen.add(parent.pid)
+            if parent.exe != target.exe:
+                ancestors.add(parent.pid)
+            parent = by_pid.get(parent.ppid)
+        members = [m for m in members if m.pid not in ancestors]
         
-        # 3. Empty recycle bin
-        try:
-            recycle_result = empty_recycle_bin()
-            recycle_data = recycle_result.get_json()
-            if recycle_data['success']:
-                results['actions'].append("Emptied Recycle Bin")
-        except Exception as e:
-            results['errors'].append(f"Recycle bin: {str(e)}")
+        processes = []
+        errors = []
+        for member in members:
+            try:
+                process = psutil.Process(member.pid)
+                if process.create_time() != member.create_time:
+                    continue
+                process.terminate()
+                processes.append(process)
+            except psutil.NoSuchProcess:
+                continue
+            except psutil.AccessDenied:
+                errors.append(f'{member.name} (PID {member.pid}): access denied')
         
-        results['total_cleared_mb'] = round(results['total_cleared_mb'], 2)
+        gone, alive = psutil.wait_procs(processes, timeout=3)
+        for process in alive:
+            try:
+                process.kill()
+            except psutil.Error:
+                pass
         
-        return jsonify(results)
+        return jsonify({
+            'success': bool(processes),
+            'app_name': app_info['name'],
+            'processes_terminated': len(processes),
+            'memory_freed_percent': round(sum(m.memory_percent or 0 for m in members), 2),
+            'memory_freed_mb': round(sum(m.rss or 0 for m in members) / (1024**2), 1),
+            'errors': errors,
+            'error': None if processes else 'Access denied - process requires administrator privileges',
+            'message': f"Successfully terminated {app_info['name']} ({len(processes)} processes)"
+        }), 200 if processes else 403
         
     except Exception as e:
         return jsonify({
@@ -522,21 +4009,242 @@ def auto_optimize():
         }), 500
 
 
+@app.route('/api/optimize/auto-optimize', methods=['POST'])
+def auto_optimize():
+    """Run all safe optimizations automatically"""
+    try:
+        return jsonify(run_auto_optimize(dry_run=_dry_run_requested()))
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+@app.route('/api/jobs/<kind>', methods=['POST'])
+def start_job(kind):
+    """Start an optimization in the background and return its job id"""
+    task = OPTIMIZATION_TASKS.get(kind)
+    if task is None:
+        return jsonify({
+            'success': False,
+            'error': f'Unknown job type: {kind}'
+        }), 404
+    
+    job = job_manager.submit(kind, functools.partial(task, dry_run=_dry_run_requested()))
+    return jsonify({
+        'success': True,
+        'job_id': job.id,
+        'job': job.to_dict()
+    }), 202
+
+
+@app.route('/api/jobs', methods=['GET'])
+def list_jobs():
+    """List recent optimization jobs"""
+    return jsonify({
+        'success': True,
+        'jobs': [job.to_dict() for job in job_manager.list()]
+    })
+
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Get the progress or result of an optimization job"""
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({
+            'success': False,
+            'error': 'Job not found'
+        }), 404
+    
+    return jsonify({
+        'success': True,
+        'job': job.to_dict()
+    })
+
+
+@app.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    """Ask a running optimization job to stop"""
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({
+            'success': False,
+            'error': 'Job not found'
+        }), 404
+    
+    job.cancel()
+    return jsonify({
+        'success': True,
+        'job': job.to_dict()
+    })
+
+
+# ============================================================================
+# FLEET ENDPOINTS
+# ============================================================================
+
+def _fleet_unavailable():
+    """Error response if this server is not a fleet aggregator, else None"""
+    if fleet_store is None:
+        return jsonify({
+            'success': False,
+            'error': 'Fleet aggregator mode is not enabled'
+        }), 404
+    if FLEET_TOKEN and request.headers.get('X-PCDoctor-Token') != FLEET_TOKEN:
+        return jsonify({
+            'success': False,
+            'error': 'Invalid fleet token'
+        }), 401
+    return None
+
+
+@app.route('/api/fleet/ingest', methods=['POST'])
+def fleet_ingest():
+    """Accept a batch of agent snapshots (NDJSON, optionally gzip-compressed)"""
+    error = _fleet_unavailable()
+    if error:
+        return error
+    
+    try:
+        body = request.get_data()
+        if request.headers.get('Content-Encoding') == 'gzip':
+            # Bounded, chunked decompression so a tiny request cannot expand without limit
+            decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            chunks = []
+            size = 0
+            pending = body
+            while pending:
+                chunk = decompressor.decompress(pending, 256 * 1024)
+                size += len(chunk)
+                if size > FLEET_MAX_INGEST_BYTES:
+                    return jsonify({
+                        'success': False,
+                        'error': 'Batch too large'
+                    }), 413
+                chunks.append(chunk)
+                pending = decompressor.unconsumed_tail
+            body = b''.join(chunks)
+        
+        snapshots = [json.loads(line) for line in body.splitlines() if line.strip()]
+        accepted = fleet_store.ingest(snapshots)
+        return jsonify({
+            'success': True,
+            'accepted': accepted,
+            'rejected': len(snapshots) - accepted
+        }), 202
+    except (ValueError, zlib.error) as e:
+        return jsonify({
+            'success': False,
+            'error': f'Invalid batch: {str(e)}'
+        }), 400
+
+
+@app.route('/api/fleet/hosts', methods=['GET'])
+def fleet_hosts():
+    """Worst hosts by ?sort=memory|swap|cpu|disk|stale"""
+    error = _fleet_unavailable()
+    if error:
+        return error
+    
+    sort = request.args.get('sort', 'memory')
+    limit = min(request.args.get('limit', 20, type=int), 1000)
+    return jsonify({
+        'success': True,
+        'sort': sort if sort in FleetStore.SORTS else 'memory',
+        'hosts': fleet_store.hosts(sort, limit)
+    })
+
+
+@app.route('/api/fleet/hosts/<host>', methods=['GET'])
+def fleet_host(host):
+    """Latest snapshot and recent history of one host"""
+    error = _fleet_unavailable()
+    if error:
+        return error
+    
+    result = fleet_store.host(host)
+    if result is None:
+        return jsonify({
+            'success': False,
+            'error': 'Host not found'
+        }), 404
+    return jsonify({
+        'success': True,
+        'host': result
+    })
+
+
+@app.route('/api/fleet/summary', methods=['GET'])
+def fleet_summary():
+    """Fleet-wide averages and counts"""
+    error = _fleet_unavailable()
+    if error:
+        return error
+    
+    return jsonify({
+        'success': True,
+        'summary': fleet_store.summary()
+    })
+
+
+startup_profile.mark('module_loaded')
+
+
 if __name__ == '__main__':
     import sys
+    import argparse
     import webbrowser
-    from threading import Timer
     import os
     
     # Hide Python warnings
     os.environ['PYTHONWARNINGS'] = 'ignore'
     
+    parser = argparse.ArgumentParser(description='PC Doctor')
+    parser.add_argument('--agent', action='store_true',
+                        help='run headless and push snapshots to a fleet aggregator')
+    parser.add_argument('--server', help='aggregator URL for --agent, e.g. http://host:5000')
+    parser.add_argument('--interval', type=float, default=60, help='seconds between agent snapshots')
+    parser.add_argument('--batch-size', type=int, default=5, help='snapshots per agent push')
+    parser.add_argument('--host-id', help='name the agent reports (defaults to the hostname)')
+    parser.add_argument('--aggregator', action='store_true',
+                        help='accept snapshots from fleet agents at /api/fleet/ingest')
+    parser.add_argument('--profile-startup', action='store_true',
+                        help='print startup timings and save them to startup-profile.json')
+    args = parser.parse_args()
+    
+    if args.agent:
+        if not args.server:
+            parser.error('--agent requires --server')
+        print(f"PC Doctor agent: pushing to {args.server} every {args.interval:g}s (Ctrl+C to stop)")
+        try:
+            FleetAgent(args.server, args.interval, args.batch_size, args.host_id).run()
+        except KeyboardInterrupt:
+            pass
+        sys.exit(0)
+    
+    if args.aggregator or FLEET_AGGREGATOR:
+        enable_fleet_aggregator()
+    
     # Check if running as executable or from source
     is_frozen = getattr(sys, 'frozen', False)
     
     def open_browser():
-        """Open browser after server starts"""
-        webbrowser.open('http://localhost:5000')
+        """Open browser as soon as the server accepts connections"""
+        if wait_until_listening('127.0.0.1', 5000):
+            startup_profile.mark('listening')
+            webbrowser.open('http://localhost:5000')
+            startup_profile.mark('browser_opened')
+        
+        if args.profile_startup or PROFILE_STARTUP:
+            print(startup_profile.report())
+            try:
+                os.makedirs(DATA_DIR, exist_ok=True)
+                with open(os.path.join(DATA_DIR, 'startup-profile.json'), 'w') as f:
+                    json.dump(startup_profile.to_dict(), f, indent=2)
+            except OSError:
+                pass
     
     def print_startup_banner():
         """Print nice startup banner"""
@@ -564,12 +4272,14 @@ if __name__ == '__main__':
         from waitress import serve
         
         print_startup_banner()
+        start_background_services()
+        startup_profile.mark('background_started')
         
-        # Open browser after 1.5 seconds
-        Timer(1.5, open_browser).start()
+        threading.Thread(target=open_browser, daemon=True).start()
         
         # Run production WSGI server - NO WARNINGS!
-        serve(app, host='0.0.0.0', port=5000, threads=4)
+        # Each open /api/live stream holds a thread, so leave room for viewers
+        serve(app, host='0.0.0.0', port=5000, threads=SERVER_THREADS)
         
     else:
         # DEVELOPMENT MODE (running from source) - Use Flask dev server
@@ -577,6 +4287,10 @@ if __name__ == '__main__':
         if os.environ.get('WERKZEUG_RUN_MAIN') != 'true':
             print("\n🔧 Development Mode - Flask debug server\n")
             print_startup_banner()
-            Timer(1, open_browser).start()
+            threading.Thread(target=open_browser, daemon=True).start()
+        else:
+            # Reloader child process - this is the one that serves requests
+            start_background_services()
+            startup_profile.mark('background_started')
         
         app.run(debug=True, host='0.0.0.0', port=5000, use_reloader=True)
@@ -0,0 +1,442 @@
+"""
+PC Doctor benchmark suite
+
+Times every PCDiagnostic.collect_* method, the full scan path (with a stub
+AI model), quick stats, the cleaning endpoints and fleet ingest from
+simulated agents. psutil is replaced by a
+deterministic fake backend so results do not depend on what the host is
+doing, and the machine size can be scaled up to stress the hot paths.
+
+Usage:
+    python benchmark.py                                   # default machine
+    python benchmark.py --processes 10000 --cores 128 --partitions 50
+    python benchmark.py --output results.json             # save results
+    python benchmark.py --baseline results.json           # compare, exit 1 on regression
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from collections import namedtuple
+
+import psutil as real_psutil
+
+# Keep indexes and history written during the run out of the user's data dir
+BENCH_DIR = tempfile.mkdtemp(prefix='pcdoctor-bench-')
+os.environ['PCDOCTOR_DATA_DIR'] = os.path.join(BENCH_DIR, 'data')
+
+import app  # noqa: E402
+
+
+scpufreq = namedtuple('scpufreq', ['current', 'min', 'max'])
+svmem = namedtuple('svmem', ['total', 'available', 'percent', 'used', 'free'])
+sswap = namedtuple('sswap', ['total', 'used', 'free', 'percent', 'sin', 'sout'])
+sdiskpart = namedtuple('sdiskpart', ['device', 'mountpoint', 'fstype', 'opts'])
+sdiskusage = namedtuple('sdiskusage', ['total', 'used', 'free', 'percent'])
+sdiskio = namedtuple('sdiskio', ['read_count', 'write_count', 'read_bytes', 'write_bytes',
+                                 'read_time', 'write_time', 'busy_time'])
+snetio = namedtuple('snetio', ['bytes_sent', 'bytes_recv', 'packets_sent', 'packets_recv',
+                               'errin', 'errout', 'dropin', 'dropout'])
+pcputimes = namedtuple('pcputimes', ['user', 'system'])
+pmem = namedtuple('pmem', ['rss', 'vms'])
+pio = namedtuple('pio', ['read_count', 'write_count', 'read_bytes', 'write_bytes'])
+
+
+class FakeProcess:
+    """Just enough of psutil.Process for process_iter(attrs) callers"""
+
+    def __init__(self, info, exe=''):
+        self.info = info
+        self.pid = info['pid']
+        self._exe = exe
+
+    def exe(self):
+        return self._exe
+
+
+class FakePsutil:
+    """Deterministic stand-in for the parts of psutil that app.py uses
+
+    Counters advance on every call so rate calculations see activity, and
+    all "random" values come from a seeded generator.
+    """
+
+    NoSuchProcess = real_psutil.NoSuchProcess
+    AccessDenied = real_psutil.AccessDenied
+    TimeoutExpired = real_psutil.TimeoutExpired
+    ZombieProcess = real_psutil.ZombieProcess
+
+    GB = 1024 ** 3
+
+    def __init__(self, processes=300, cores=8, partitions=3, disks=2, nics=2, seed=42):
+        self.cores = cores
+        self.partitions = partitions
+        self.disks = disks
+        self.nics = nics
+        self.rng = random.Random(seed)
+        self.ticks = 0
+        self.started = time.time()
+        names = ['chrome.exe', 'code.exe', 'python.exe', 'svchost.exe', 'explorer.exe',
+                 'teams.exe', 'node.exe', 'java.exe', 'postgres', 'slack.exe']
+        self.process_table = [
+            {
+                'pid': 1000 + i,
+                'ppid': 1000 + i // 10 if i >= 10 else 1,
+                'name': names[i % len(names)],
+                'exe': f'C:\\Program Files\\{names[i % len(names)]}',
+                'create_time': self.started - 3600 - i,
+                'status': 'running' if i % 7 == 0 else 'sleeping',
+                'memory_percent': self.rng.random() * 2,
+                'rss': self.rng.randint(10, 500) * 1024 ** 2,
+                'cpu_rate': self.rng.random() * 0.05,
+            }
+            for i in range(processes)
+        ]
+
+    # CPU ------------------------------------------------------------------
+    def cpu_percent(self, interval=None, percpu=False):
+        if percpu:
+            return [round(self.rng.random() * 100, 1) for _ in range(self.cores)]
+        return round(self.rng.random() * 100, 1)
+
+    def cpu_count(self, logical=True):
+        return self.cores if logical else max(1, self.cores // 2)
+
+    def cpu_freq(self, percpu=False):
+        return scpufreq(3200.0, 800.0, 4500.0)
+
+    # Memory ---------------------------------------------------------------
+    def virtual_memory(self):
+        total = 32 * self.GB
+        used = int(total * (0.4 + self.rng.random() * 0.2))
+        return svmem(total, total - used, round(used / total * 100, 1), used, total - used)
+
+    def swap_memory(self):
+        total = 8 * self.GB
+        used = int(total * 0.1)
+        return sswap(total, used, total - used, 10.0, 0, 0)
+
+    # Disk -----------------------------------------------------------------
+    def disk_partitions(self, all=False):
+        return [sdiskpart(f'/dev/fake{i}', '/' if i == 0 else f'/mnt/fake{i}', 'ext4', 'rw')
+                for i in range(self.partitions)]
+
+    def disk_usage(self, path):
+        total = 512 * self.GB
+        used = int(total * 0.65)
+        return sdiskusage(total, used, total - used, 65.0)
+
+    def _disk_counter(self, index):
+        t = self.ticks
+        return sdiskio(100 * t + index, 50 * t, 4096 * 100 * t, 4096 * 50 * t, 10 * t, 5 * t, 7 * t)
+
+    def disk_io_counters(self, perdisk=False, nowrap=True):
+        self.ticks += 1
+        if perdisk:
+            return {f'fake{i}': self._disk_counter(i) for i in range(self.disks)}
+        return self._disk_counter(0)
+
+    # Network --------------------------------------------------------------
+    def _nic_counter(self, index):
+        t = self.ticks
+        return snetio(1500 * 20 * t, 1500 * 40 * t, 20 * t, 40 * t, 0, 0, index, 0)
+
+    def net_io_counters(self, pernic=False, nowrap=True):
+        if pernic:
+            return {f'eth{i}': self._nic_counter(i) for i in range(self.nics)}
+        return self._nic_counter(0)
+
+    # Processes ------------------------------------------------------------
+    def process_iter(self, attrs=None, ad_value=None):
+        elapsed = time.time() - self.started
+        for proc in self.process_table:
+            info = {
+                'pid': proc['pid'],
+                'ppid': proc['ppid'],
+                'name': proc['name'],
+                'exe': proc['exe'],
+                'create_time': proc['create_time'],
+                'status': proc['status'],
+                'cpu_times': pcputimes(proc['cpu_rate'] * elapsed, proc['cpu_rate'] * elapsed / 4),
+                'cpu_percent': 0.0,
+                'memory_info': pmem(proc['rss'], proc['rss'] * 2),
+                'memory_percent': proc['memory_percent'],
+                'io_counters': pio(0, 0, int(proc['cpu_rate'] * elapsed * 2**30), int(proc['cpu_rate'] * elapsed * 2**28)),
+            }
+            if attrs is not None:
+                info = {key: info.get(key, ad_value) for key in attrs}
+            yield FakeProcess(info, proc['exe'])
+
+    def Process(self, pid):
+        raise real_psutil.NoSuchProcess(pid)
+
+    # System ---------------------------------------------------------------
+    def boot_time(self):
+        return self.started - 86400
+
+
+class StubModel:
+    """Local model client returning a fixed analysis, with no network"""
+    name = 'benchmark-stub'
+
+    def generate(self, prompt):
+        return json.dumps({
+            'health_score': 80,
+            'health_status': 'Good',
+            'critical_issues': [],
+            'performance_bottlenecks': [],
+            'recommendations': [],
+            'quick_insights': {
+                'cpu_status': 'Healthy',
+                'memory_status': 'Healthy',
+                'disk_status': 'Healthy',
+                'overall_summary': 'Benchmark stub analysis'
+            }
+        })
+
+
+def make_tree(root, files, dirs_per_level=10, file_size=1024):
+    """Generate a nested directory tree of `files` small files under root"""
+    os.makedirs(root, exist_ok=True)
+    payload = b'x' * file_size
+    per_dir = max(1, files // (dirs_per_level * dirs_per_level))
+    written = 0
+    for i in range(dirs_per_level):
+        for j in range(dirs_per_level):
+            directory = os.path.join(root, f'd{i}', f'd{j}')
+            os.makedirs(directory, exist_ok=True)
+            for k in range(per_dir):
+                if written >= files:
+                    return written
+                with open(os.path.join(directory, f'f{k}.tmp'), 'wb') as f:
+                    f.write(payload)
+                written += 1
+    return written
+
+
+def measure(func, runs, setup=None, warmup=1):
+    """Time func() `runs` times (after warmup) and summarize in milliseconds"""
+    timings = []
+    for i in range(warmup + runs):
+        if setup:
+            setup()
+        started = time.perf_counter()
+        func()
+        elapsed = (time.perf_counter() - started) * 1000
+        if i >= warmup:
+            timings.append(elapsed)
+    timings.sort()
+    return {
+        'runs': runs,
+        'median_ms': round(statistics.median(timings), 3),
+        'p95_ms': round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 3),
+        'min_ms': round(timings[0], 3),
+        'max_ms': round(timings[-1], 3)
+    }
+
+
+def run_benchmarks(args):
+    fake = FakePsutil(processes=args.processes, cores=args.cores, partitions=args.partitions)
+    app.psutil = fake
+    app.model_client = StubModel()
+    # The disk index would walk the real home folder
+    app.disk_index.roots = []
+    app.sampler.interval = 0.05
+    app.sampler.start()
+    app.sampler.latest()
+    time.sleep(0.3)
+    app.process_table.refresh(force=True)
+
+    client = app.app.test_client()
+    results = {}
+
+    def check(response):
+        if response.status_code >= 400:
+            raise RuntimeError(f'{response.status_code}: {response.get_data(as_text=True)[:200]}')
+
+    # Individual collectors, called directly (no thread pool)
+    for section, method_name in app.PCDiagnostic.COLLECTORS:
+        diagnostic = app.PCDiagnostic()
+        if section == 'processes':
+            # Force a real table refresh every run instead of the 1s reuse
+            func = lambda d=diagnostic: (setattr(app.process_table, 'last_refresh', 0.0),
+                                         d.collect_process_info())
+        else:
+            func = getattr(diagnostic, method_name)
+        results[f'collect.{section}'] = measure(func, args.runs)
+
+    results['collect.all'] = measure(lambda: app.PCDiagnostic().collect_all_diagnostics(), args.runs)
+
+    diagnostic = app.PCDiagnostic()
+    diagnostic.collect_all_diagnostics()
+    entries = [entry for _, entry in app.process_table.items()]
+    results['apps.aggregate'] = measure(lambda: app.aggregate_apps(entries), args.runs)
+    results['prompt.compact'] = measure(lambda: app.compact_diagnostics(diagnostic.data), args.runs)
+
+    # Endpoints through the Flask test client
+    results['endpoint.quick_stats'] = measure(lambda: check(client.get('/api/quick-stats')), args.runs)
+    results['endpoint.scan'] = measure(lambda: check(client.post('/api/scan?refresh=1')), args.runs)
+    results['endpoint.scan_cached'] = measure(lambda: check(client.post('/api/scan')), args.runs)
+
+    def scan_burst():
+        threads = [threading.Thread(target=lambda: check(app.app.test_client().post('/api/scan?refresh=1')))
+                   for _ in range(args.burst)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    results['endpoint.scan_burst'] = measure(scan_burst, max(1, args.runs // 4))
+    results['endpoint.scan_stream'] = measure(
+        lambda: check(client.post('/api/scan/stream?refresh=1')), args.runs)
+
+    # Live stats: one sampler update fanned out to many SSE subscribers
+    subscribers = [app.live_broadcaster.subscribe(['cpu_percent', 'memory_percent'])
+                   for _ in range(args.live_subscribers)]
+    latest = app.sampler.latest()
+    tick = iter(range(1, 10**9))
+    results['live.broadcast'] = measure(
+        lambda: app.live_broadcaster.on_sample(latest._replace(timestamp=latest.timestamp + next(tick) * 60)),
+        args.runs)
+    for subscriber in subscribers:
+        app.live_broadcaster.unsubscribe(subscriber)
+
+    # Cleaning against generated trees
+    temp_root = os.path.join(BENCH_DIR, 'temp')
+    cache_root = os.path.join(BENCH_DIR, 'localappdata')
+    chrome_cache = os.path.join(cache_root, 'Google', 'Chrome', 'User Data', 'Default', 'Cache')
+    tempfile.tempdir = temp_root
+    os.environ['LOCALAPPDATA'] = cache_root
+
+    def fresh_temp():
+        shutil.rmtree(temp_root, ignore_errors=True)
+        make_tree(temp_root, args.files)
+
+    def fresh_cache():
+        shutil.rmtree(cache_root, ignore_errors=True)
+        make_tree(chrome_cache, args.files)
+
+    clean_runs = max(1, args.runs // 4)
+    fresh_temp()
+    results['endpoint.temp_files_dry_run'] = measure(
+        lambda: check(client.post('/api/optimize/temp-files?dry_run=1')), clean_runs)
+    results['endpoint.temp_files'] = measure(
+        lambda: check(client.post('/api/optimize/temp-files')), clean_runs, setup=fresh_temp)
+    results['endpoint.browser_cache'] = measure(
+        lambda: check(client.post('/api/optimize/browser-cache')), clean_runs, setup=fresh_cache)
+
+    # Fleet ingest: simulated agents pushing gzipped batches to the aggregator
+    if args.fleet_agents:
+        import gzip
+        store = app.enable_fleet_aggregator(os.path.join(BENCH_DIR, 'fleet.db'))
+        snapshot = app.PCDiagnostic().collect_all_diagnostics()
+        rng = random.Random(7)
+        bodies = []
+        for agent in range(args.fleet_agents):
+            batch = []
+            for k in range(5):
+                data = json.loads(json.dumps(snapshot))
+                data['memory']['usage_percent'] = round(rng.random() * 100, 1)
+                batch.append({'host': f'agent-{agent}', 'timestamp': time.time() + k, 'data': data})
+            bodies.append(gzip.compress('\n'.join(json.dumps(s) for s in batch).encode('utf-8')))
+        
+        def ingest_all():
+            for body in bodies:
+                check(client.post('/api/fleet/ingest', data=body, headers={'Content-Encoding': 'gzip'}))
+            while store.queue.qsize():
+                time.sleep(0.01)
+        
+        results['fleet.ingest_all_agents'] = measure(ingest_all, max(1, args.runs // 4), warmup=0)
+        results['fleet.worst_hosts'] = measure(
+            lambda: check(client.get('/api/fleet/hosts?sort=memory&limit=20')), args.runs)
+
+    app.sampler.stop()
+    return results
+
+
+def compare(results, baseline, tolerance, min_delta_ms):
+    """Print a comparison table and return the names that regressed"""
+    regressions = []
+    print(f"\n{'benchmark':<32}{'baseline':>12}{'current':>12}{'change':>10}")
+    print('-' * 66)
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            print(f"{name:<32}{'-':>12}{current['median_ms']:>10.2f}ms{'new':>10}")
+            continue
+        ratio = current['median_ms'] / previous['median_ms'] if previous['median_ms'] else 1.0
+        flag = ''
+        # Sub-millisecond benchmarks jitter by large ratios; ignore tiny deltas
+        if ratio > 1 + tolerance and current['median_ms'] - previous['median_ms'] > min_delta_ms:
+            regressions.append(name)
+            flag = ' !'
+        print(f"{name:<32}{previous['median_ms']:>10.2f}ms{current['median_ms']:>10.2f}ms"
+              f"{(ratio - 1) * 100:>+9.1f}%{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='PC Doctor benchmark suite')
+    parser.add_argument('--processes', type=int, default=300, help='simulated processes')
+    parser.add_argument('--cores', type=int, default=8, help='simulated logical cores')
+    parser.add_argument('--partitions', type=int, default=3, help='simulated partitions')
+    parser.add_argument('--files', type=int, default=5000, help='files per generated cleaning tree')
+    parser.add_argument('--fleet-agents', type=int, default=200,
+                        help='simulated agents pushing to the fleet aggregator (0 to skip)')
+    parser.add_argument('--burst', type=int, default=8, help='concurrent requests in the scan burst')
+    parser.add_argument('--live-subscribers', type=int, default=50,
+                        help='simulated live stats viewers')
+    parser.add_argument('--runs', type=int, default=20, help='timed runs per benchmark')
+    parser.add_argument('--output', help='write results as JSON to this file')
+    parser.add_argument('--baseline', help='compare against a previous --output file')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='allowed slowdown vs baseline before failing (0.2 = 20%%)')
+    parser.add_argument('--min-delta-ms', type=float, default=0.5,
+                        help='ignore slowdowns smaller than this many milliseconds')
+    args = parser.parse_args()
+
+    try:
+        results = run_benchmarks(args)
+    finally:
+        shutil.rmtree(BENCH_DIR, ignore_errors=True)
+
+    report = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'processes': args.processes,
+            'cores': args.cores,
+            'partitions': args.partitions,
+            'files': args.files,
+            'fleet_agents': args.fleet_agents,
+            'live_subscribers': args.live_subscribers,
+            'burst': args.burst,
+            'runs': args.runs
+        },
+        'results': results
+    }
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+        regressions = compare(results, baseline, args.tolerance, args.min_delta_ms)
+        if regressions:
+            print(f"\nRegressed beyond {args.tolerance:.0%}: {', '.join(regressions)}")
+            sys.exit(1)
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()